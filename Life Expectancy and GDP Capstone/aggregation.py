@@ -0,0 +1,102 @@
+# coding: utf-8
+"""Memoized group summaries (mean and bootstrap CI) for the bar charts.
+
+The seaborn barplots in In[9], In[10], In[12] and In[17]-In[19] each compute
+means and bootstrapped confidence intervals from the raw rows every time
+they are drawn. `summarize` computes those statistics once per (data,
+grouping, value, CI settings) and keeps the result in an LRU cache, and
+optionally on disk, so charts can be redrawn from the summary table alone.
+"""
+
+import collections
+import hashlib
+import os
+
+import pandas as pd
+
+from bootstrap import CI, N_BOOT, SEED, grouped_bootstrap
+from panel import Panel
+
+SUMMARY_COLUMNS = ['mean', 'ci_low', 'ci_high', 'count']
+
+
+def fingerprint(df, columns):
+    """SHA-1 of the given columns of `df`, order and dtype included."""
+    digest = hashlib.sha1(repr([(c, str(df[c].dtype)) for c in columns]).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df[columns], index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def compute_summary(df, value, by=('Country',), ci=CI, n_boot=N_BOOT, seed=SEED):
+    """Mean, percentile bootstrap CI and count of `value` for each group.
+
+    Returns one row per group with the `by` columns followed by
+    SUMMARY_COLUMNS. With `ci=None` the CI columns are NaN and no
+    resampling is done.
+    """
+    return grouped_bootstrap(df, value, by, n_boot, ci, seed)
+
+
+class AggregationCache(object):
+    """LRU cache of summary tables, optionally backed by a directory.
+
+    Entries are keyed on a fingerprint of the grouping and value columns plus
+    the CI settings, so a changed panel never hits a stale summary.
+    """
+
+    def __init__(self, maxsize=128, directory=None):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+
+    def key(self, df, value, by, ci, n_boot, seed):
+        columns = list(by) + [value]
+        params = repr((tuple(by), value, ci, n_boot, seed))
+        return hashlib.sha1((fingerprint(df, columns) + params).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.pkl')
+
+    def get(self, df, value, by=('Country',), ci=CI, n_boot=N_BOOT, seed=SEED):
+        """Return the summary for these arguments, computing it on a miss."""
+        key = self.key(df, value, by, ci, n_boot, seed)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+        summary = None
+        if self.directory is not None and os.path.exists(self._path(key)):
+            summary = pd.read_pickle(self._path(key))
+            self.hits += 1
+        if summary is None:
+            self.misses += 1
+            summary = compute_summary(df, value, by, ci, n_boot, seed)
+            if self.directory is not None:
+                os.makedirs(self.directory, exist_ok=True)
+                summary.to_pickle(self._path(key) + '.tmp')
+                os.replace(self._path(key) + '.tmp', self._path(key))
+
+        self._entries[key] = summary
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return summary
+
+
+default_cache = AggregationCache()
+
+
+def summarize(data, value, by=('Country',), ci=CI, n_boot=N_BOOT, seed=SEED, cache=None):
+    """Cached `compute_summary` over a DataFrame or `panel.Panel`."""
+    frame = data.frame if isinstance(data, Panel) else data
+    if cache is None:
+        cache = default_cache
+    return cache.get(frame, value, by, ci, n_boot, seed)
@@ -0,0 +1,160 @@
+# coding: utf-8
+"""Stage-by-stage benchmark of the analysis and plotting pipeline.
+
+Synthesizes panels with the all_data.csv schema at several sizes, writes
+each one to CSV and times every stage the notebook goes through: loading
+(In[3]), renaming (In[7]), the per-country first-year summary (In[14]), the
+growth columns (In[15]), the LEABY index (In[21]) and each figure from In[9]
+to In[27]. Wall time and peak traced memory are reported per stage.
+tracemalloc slows plotting several times over, so each stage is timed
+untraced and then run a second time under tracemalloc to measure its peak
+(skip that with --no-memory).
+
+    python benchmarks.py --sizes 1000 100000 10000000 --max-figure-rows 10000
+
+Figures are only drawn up to `--max-figure-rows` rows, since the per-country
+FacetGrids grow with the number of countries.
+"""
+
+import argparse
+import gc
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+DEFAULT_SIZES = (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7)
+MAX_FIGURE_ROWS = 10 ** 4
+
+
+def time_stage(fn, arg, setup=None, memory=True):
+    """Run `fn(arg)`; return (result, wall seconds, peak traced bytes or None).
+
+    `setup`, if given, is called before each run to reset any state the
+    stage depends on.
+    """
+    gc.collect()
+    if setup is not None:
+        setup()
+    t0 = time.perf_counter()
+    result = fn(arg)
+    wall = time.perf_counter() - t0
+    peak = None
+    if memory:
+        del result
+        gc.collect()
+        if setup is not None:
+            setup()
+        tracemalloc.start()
+        try:
+            result = fn(arg)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result, wall, peak
+
+
+def _stages(path, out_dir, figures):
+    # (name, fn, setup) triples; each fn takes the previous stage's result.
+    import pandas as pd
+
+    from data_loader import LEABY_COLUMN, cache_dir, load_data
+    from growth_metrics import add_growth_columns
+    from normalize import normalize
+    from panel import Panel
+
+    def first_year_gdp(df):
+        panel = Panel(df)
+        return panel, {country: rows['GDP'].iloc[0] for country, rows in panel}
+
+    def drop_cache():
+        shutil.rmtree(cache_dir(path), ignore_errors=True)
+
+    stages = [
+        ('csv_load', lambda _: pd.read_csv(path), None),
+        ('rename', lambda df: df.rename(columns={LEABY_COLUMN: 'LEABY'}), None),
+        ('cached_load_cold', lambda _: load_data(path), drop_cache),
+        ('cached_load_warm', lambda _: load_data(path), None),
+        ('country_summary', first_year_gdp, None),
+        ('growth_columns', lambda result: Panel(add_growth_columns(result[0])), None),
+        ('normalize', lambda panel: Panel(normalize(panel, 'LEABY', 'index', base_year=2000)),
+         None),
+    ]
+    if figures:
+        import render
+        from aggregation import default_cache
+        render._init_worker()
+        for spec in render.CHARTS:
+            # Clear the statistics cache so the traced rerun recomputes them too.
+            stages.append(('figure:' + spec.name, _figure_stage(render, spec, out_dir),
+                           default_cache.clear))
+    return stages
+
+
+def _figure_stage(render, spec, out_dir):
+    def draw(panel):
+        # Pass the panel along so every figure starts from it. Charts tied
+        # to countries the synthetic data lacks draw nothing.
+        data = render.chart_data(panel, spec)
+        if not data.empty:
+            render.render_chart(spec, data, out_dir)
+        return panel
+    return draw
+
+
+def run(sizes=DEFAULT_SIZES, max_figure_rows=MAX_FIGURE_ROWS, workdir=None, memory=True,
+        report=print):
+    """Benchmark every stage at every size; return a list of result dicts."""
+    from data_loader import LEABY_COLUMN
+    from synthetic import synthetic_rows
+
+    own_dir = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix='le-gdp-bench-')
+    results = []
+    report('%10s  %-34s %10s %10s' % ('rows', 'stage', 'wall s', 'peak MB'))
+    try:
+        for size in sizes:
+            path = os.path.join(workdir, 'panel_%d.csv' % size)
+            df = synthetic_rows(size)
+            df = df.assign(Year=df['Year'] - df['Year'].min() + 2000)
+            df.rename(columns={'LEABY': LEABY_COLUMN}).to_csv(path, index=False)
+            rows = len(df)
+            del df
+
+            figures = rows <= max_figure_rows
+            out_dir = os.path.join(workdir, 'figures_%d' % size)
+            os.makedirs(out_dir, exist_ok=True)
+            value = None
+            for name, fn, setup in _stages(path, out_dir, figures):
+                value, wall, peak = time_stage(fn, value, setup, memory)
+                results.append({'rows': rows, 'stage': name, 'wall_s': wall,
+                                'peak_bytes': peak})
+                peak_mb = '%10.1f' % (peak / 2.0 ** 20) if peak is not None else '%10s' % '-'
+                report('%10d  %-34s %10.4f %s' % (rows, name, wall, peak_mb))
+            del value
+    finally:
+        if own_dir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', nargs='+', type=int, default=list(DEFAULT_SIZES))
+    parser.add_argument('--max-figure-rows', type=int, default=MAX_FIGURE_ROWS)
+    parser.add_argument('--workdir', help='keep the CSVs and figures here')
+    parser.add_argument('--json', help='also write the results to this file')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='skip the traced second run of each stage')
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.max_figure_rows, args.workdir, not args.no_memory)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
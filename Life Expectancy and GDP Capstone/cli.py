@@ -0,0 +1,180 @@
+# coding: utf-8
+"""Command-line entry point for the life expectancy / GDP analysis.
+
+    python cli.py summarize --data all_data.csv
+    python cli.py growth --base-year 2000 --out growth.csv
+    python cli.py render --out figures --format png svg
+    python cli.py report --out report --countries Chile Mexico Zimbabwe
+    python cli.py serve --port 8000
+    python cli.py startup
+
+Only `render` and `report` import matplotlib and seaborn, and the Agg
+backend is chosen before anything can import pyplot, so data-only commands
+start without the plotting stack and nothing ever needs a display. `startup` times the
+data-only commands with and without the eager In[1] plotting imports.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+# Set before any import can pull in pyplot; worker processes inherit it.
+os.environ['MPLBACKEND'] = 'Agg'
+
+EAGER_IMPORTS = 'from matplotlib import pyplot; import pandas; import seaborn'
+
+
+def summarize(args):
+    """Per-country means (In[9]/In[10]) and first-year GDP (In[14])."""
+    import pandas as pd
+    from streaming import summarize as stream_summary
+
+    summary = stream_summary(args.data, args.chunksize)
+    table = summary.country_means().add_prefix('mean_')
+    table['first_year_GDP'] = summary.first_year_values('GDP')
+    if args.ci:
+        from aggregation import summarize as bootstrap_summary
+        from data_loader import load_data
+
+        df = load_data(args.data)
+        for value in ('GDP', 'LEABY'):
+            ci = bootstrap_summary(df, value).set_index('Country')
+            table[value + '_ci_low'] = ci['ci_low']
+            table[value + '_ci_high'] = ci['ci_high']
+    table.index.name = 'Country'
+    if args.out:
+        table.to_csv(args.out)
+    else:
+        with pd.option_context('display.width', 200, 'display.max_columns', None):
+            print(table)
+
+
+def growth(args):
+    """The data with the In[15] growth columns, as CSV."""
+    if args.stream:
+        from streaming import write_growth_columns
+
+        write_growth_columns(args.data, args.out or sys.stdout, base_year=args.base_year,
+                             chunksize=args.chunksize)
+        return
+    from data_loader import load_data
+    from growth_metrics import add_growth_columns
+
+    frame = add_growth_columns(load_data(args.data), base_year=args.base_year)
+    frame.to_csv(args.out or sys.stdout, index=False)
+
+
+def render(args):
+    """Draw every chart from In[9] to In[27] into `--out`."""
+    import render as renderer
+
+    renderer.run(args)
+
+
+def report(args):
+    """Export the Step 12 charts and summary table as an HTML/PDF bundle."""
+    import report as reporter
+
+    reporter.run(args)
+
+
+def serve(args):
+    """Answer point, range and top-N queries as JSON over local HTTP."""
+    from data_loader import load_data
+    from query import QueryEngine, serve as serve_queries
+
+    serve_queries(QueryEngine(load_data(args.data)), args.host, args.port)
+
+
+def _command_seconds(code, repeat):
+    # Best of `repeat` fresh interpreters running `code`, output discarded.
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.check_call([sys.executable, '-c', code], stdout=subprocess.DEVNULL,
+                              cwd=os.path.dirname(os.path.abspath(__file__)))
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def startup(args):
+    """Time data-only commands with lazy imports and with the In[1] imports."""
+    data = os.path.abspath(args.data)
+    commands = [
+        ('import only', None),
+        ('summarize', ['summarize', '--data', data]),
+        ('growth', ['growth', '--data', data, '--out', os.devnull]),
+    ]
+    print('%-12s %10s %10s %10s' % ('command', 'lazy s', 'eager s', 'saved s'))
+    for name, argv in commands:
+        run = 'import cli' if argv is None else 'import cli; cli.main(%r)' % (argv,)
+        lazy = _command_seconds(run, args.repeat)
+        eager = _command_seconds(EAGER_IMPORTS + '; ' + run, args.repeat)
+        print('%-12s %10.3f %10.3f %10.3f' % (name, lazy, eager, eager - lazy))
+
+
+def parser():
+    result = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = result.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('summarize', help=summarize.__doc__)
+    p.add_argument('--data', default='all_data.csv')
+    p.add_argument('--out', help='write CSV here instead of printing')
+    p.add_argument('--ci', action='store_true', help='add bootstrap 95%% CIs of the means')
+    p.add_argument('--chunksize', type=int, default=10 ** 6)
+    p.set_defaults(func=summarize)
+
+    p = commands.add_parser('growth', help=growth.__doc__)
+    p.add_argument('--data', default='all_data.csv')
+    p.add_argument('--out', help='CSV path (default: stdout)')
+    p.add_argument('--base-year', type=int, default=2000)
+    p.add_argument('--stream', action='store_true',
+                   help='process the CSV in chunks instead of loading it whole')
+    p.add_argument('--chunksize', type=int, default=10 ** 6)
+    p.set_defaults(func=growth)
+
+    # The same options as `python render.py` and `python report.py`. Building
+    # them imports render (and with it pandas, which every command but
+    # startup loads anyway) but not the plotting stack.
+    from render import add_limit_arguments
+    from report import add_arguments as add_report_arguments
+
+    p = commands.add_parser('render', help=render.__doc__)
+    p.add_argument('--data', default='all_data.csv')
+    p.add_argument('--out', default='figures')
+    p.add_argument('--format', nargs='+', default=['png'], choices=['png', 'svg'])
+    p.add_argument('--countries', nargs='+')
+    p.add_argument('--only', nargs='+', metavar='CHART')
+    p.add_argument('--workers', type=int)
+    p.add_argument('--force', action='store_true')
+    p.add_argument('--cache-dir', help='keep bar-chart statistics in this directory')
+    add_limit_arguments(p)
+    p.set_defaults(func=render)
+
+    p = commands.add_parser('report', help=report.__doc__)
+    add_report_arguments(p)
+    p.set_defaults(func=report)
+
+    p = commands.add_parser('serve', help=serve.__doc__)
+    p.add_argument('--data', default='all_data.csv')
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('--port', type=int, default=8000)
+    p.set_defaults(func=serve)
+
+    p = commands.add_parser('startup', help=startup.__doc__)
+    p.add_argument('--data', default='all_data.csv')
+    p.add_argument('--repeat', type=int, default=5)
+    p.set_defaults(func=startup)
+    return result
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
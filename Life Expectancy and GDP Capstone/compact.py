@@ -0,0 +1,91 @@
+# coding: utf-8
+"""Compact in-memory representation of the country/year panel.
+
+`pd.read_csv` gives `Country` as Python strings and 64-bit numbers, and the
+notebook adds its derived columns as ints (`df_c['percent_growth'] = 0`)
+that are upcast to float on first assignment. `compact_frame` stores
+countries as categorical codes, years as the smallest integer type that
+fits, and floats as float32 wherever that stays within `float_rtol` of the
+original; GDP and other money columns stay float64.
+
+`data_loader.load_data` already parses all_data.csv straight into these
+dtypes (`CSV_DTYPES`), so the pipeline never needs a second conversion;
+`compact_frame` is for frames that come from elsewhere, such as
+`pd.read_csv` output or synthetic panels.
+"""
+
+import numpy as np
+import pandas as pd
+
+FLOAT_RTOL = 1e-6
+EXACT_COLUMNS = ('GDP',)
+
+
+def _smallest_int(values):
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if values.min() >= info.min and values.max() <= info.max:
+            return dtype
+    return np.int64
+
+
+def _fits_float32(values, rtol):
+    values = values.to_numpy(dtype='float64', na_value=np.nan)
+    narrow = values.astype(np.float32).astype(np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        error = np.abs(narrow - values) / np.abs(values)
+    return bool(np.nanmax(np.where(values == 0, 0.0, error), initial=0.0) <= rtol)
+
+
+def compact_frame(df, float_rtol=FLOAT_RTOL, exact=EXACT_COLUMNS):
+    """Return `df` with compact dtypes and a RangeIndex.
+
+    Object columns become categoricals, integer columns the smallest signed
+    type that holds them, and float columns not listed in `exact` become
+    float32 if every value survives the round trip within `float_rtol`.
+    """
+    out = {}
+    for name, column in df.items():
+        if column.dtype == object or pd.api.types.is_string_dtype(column.dtype):
+            out[name] = column.astype('category')
+        elif pd.api.types.is_integer_dtype(column.dtype) and len(column):
+            out[name] = column.astype(_smallest_int(column.to_numpy()))
+        elif (pd.api.types.is_float_dtype(column.dtype) and name not in exact
+              and _fits_float32(column, float_rtol)):
+            out[name] = column.astype(np.float32)
+        else:
+            out[name] = column
+    return pd.DataFrame(out).reset_index(drop=True)
+
+
+def memory_per_row(df):
+    """Bytes per row, including the index and the contents of strings."""
+    return df.memory_usage(index=True, deep=True).sum() / float(max(len(df), 1))
+
+
+def memory_report(df):
+    """Per-column bytes per row of `df` as read and after `compact_frame`."""
+    compact = compact_frame(df)
+    rows = float(max(len(df), 1))
+    report = pd.DataFrame({
+        'dtype': df.dtypes.astype(str),
+        'bytes_per_row': df.memory_usage(index=False, deep=True) / rows,
+        'compact_dtype': compact.dtypes.astype(str),
+        'compact_bytes_per_row': compact.memory_usage(index=False, deep=True) / rows,
+    })
+    report.loc['Index'] = ['', df.index.memory_usage(deep=True) / rows, '',
+                           compact.index.memory_usage(deep=True) / rows]
+    report.loc['total'] = ['', memory_per_row(df), '', memory_per_row(compact)]
+    return report
+
+
+if __name__ == '__main__':
+    import sys
+    from synthetic import synthetic_rows
+
+    if len(sys.argv) > 1:
+        frame = pd.read_csv(sys.argv[1]).rename(
+            index=str, columns={'Life expectancy at birth (years)': 'LEABY'})
+    else:
+        frame = synthetic_rows(10 ** 6).astype({'Country': object})
+    print(memory_report(frame).round(2).to_string())
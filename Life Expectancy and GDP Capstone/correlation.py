@@ -0,0 +1,161 @@
+# coding: utf-8
+"""GDP / life expectancy correlation statistics per country and year window.
+
+The notebook answers "Is there a correlation between GDP and life
+expectancy?" by looking at the FacetGrids in In[22] and In[25].
+`correlations` computes the numbers instead: Pearson and Spearman
+correlation, Pearson against log GDP, and the OLS slope and intercept of
+LEABY on GDP, for every country, every sliding year window and any number of
+lags.
+
+All countries and windows are handled together: the panel is laid out as a
+countries x years grid (missing years are NaN) and each statistic is a sum
+over the last axis of a sliding-window view of that grid, so there are no
+per-country Python loops.
+"""
+
+import warnings
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from panel import as_panel
+
+RESULT_COLUMNS = ['Country', 'lag', 'start_year', 'end_year', 'n', 'pearson',
+                  'spearman', 'log_pearson', 'slope', 'intercept']
+
+
+def year_grid(data, column, country='Country', year='Year'):
+    """Lay `column` out as a (countries, years) array, NaN where missing.
+
+    Returns (countries, years, grid) with years running from the first to
+    the last year in the panel without gaps.
+    """
+    panel = as_panel(data, country, year)
+    years_of_row = panel.frame[year].to_numpy()
+    first = int(years_of_row.min()) if len(years_of_row) else 0
+    last = int(years_of_row.max()) if len(years_of_row) else -1
+    grid = np.full((len(panel.countries), last - first + 1), np.nan)
+    grid[panel.group_ids(), years_of_row - first] = panel.frame[column].to_numpy(dtype='float64')
+    return panel.countries, np.arange(first, last + 1), grid
+
+
+def _shift(grid, lag):
+    # Column t of the result holds column t + lag of `grid`.
+    out = np.full_like(grid, np.nan)
+    if lag >= 0:
+        out[:, :grid.shape[1] - lag] = grid[:, lag:]
+    else:
+        out[:, -lag:] = grid[:, :lag]
+    return out
+
+
+def _moments(x, y):
+    # Pairwise-complete sums over the last axis.
+    valid = ~(np.isnan(x) | np.isnan(y))
+    x = np.where(valid, x, 0.0)
+    y = np.where(valid, y, 0.0)
+    n = valid.sum(axis=-1)
+    sx, sy = x.sum(axis=-1), y.sum(axis=-1)
+    sxx, syy, sxy = (x * x).sum(axis=-1), (y * y).sum(axis=-1), (x * y).sum(axis=-1)
+    return n, n * sxy - sx * sy, n * sxx - sx * sx, n * syy - sy * sy, sx, sy
+
+
+def _pearson(x, y):
+    n, cov, var_x, var_y, _, _ = _moments(x, y)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return n, cov / np.sqrt(var_x * var_y)
+
+
+def _average_ranks(x):
+    # Ranks along the last axis, ties averaged, NaN left as NaN.
+    valid = ~np.isnan(x)
+    a = x[..., :, None]
+    b = x[..., None, :]
+    less = ((b < a) & valid[..., None, :]).sum(axis=-1)
+    equal = ((b == a) & valid[..., None, :]).sum(axis=-1)
+    return np.where(valid, less + (equal + 1) / 2.0, np.nan)
+
+
+def correlations(data, x='GDP', y='LEABY', window=None, lags=(0,), min_periods=3,
+                 country='Country', year='Year'):
+    """Tidy table of correlation statistics between `x` and `y`.
+
+    With `window=None` each country gets a single window covering every
+    year; otherwise one row per country and sliding window of `window`
+    years. For lag k, `x` in year t is paired with `y` in year t + k (the
+    window is given in years of `x`). Statistics with fewer than
+    `min_periods` complete pairs are NaN. Columns are RESULT_COLUMNS.
+    Raises ValueError for a lag of as many years as the data spans or more.
+    """
+    panel = as_panel(data, country, year)
+    countries, years, gx = year_grid(panel, x, country, year)
+    _, _, gy = year_grid(panel, y, country, year)
+    if window is None:
+        window = len(years)
+    if not 1 <= window <= len(years):
+        raise ValueError('window must be between 1 and %d years' % len(years))
+    lags = list(lags)
+    if any(abs(lag) >= len(years) for lag in lags):
+        raise ValueError('lags must be shorter than the %d years of data' % len(years))
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        log_gx = np.log(np.where(gx > 0, gx, np.nan))
+    # Centre each country's series so the raw sums of squares do not lose
+    # precision on GDP-sized values; only the intercept needs shifting back.
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        cx = np.nanmean(gx, axis=1, keepdims=True)
+        cy = np.nanmean(gy, axis=1, keepdims=True)
+    gx, gy = gx - cx, gy - cy
+    wx = sliding_window_view(gx, window, axis=1)
+    wlx = sliding_window_view(log_gx, window, axis=1)
+    n_windows = wx.shape[1]
+    starts = years[:n_windows]
+
+    tables = []
+    for lag in lags:
+        wy = sliding_window_view(_shift(gy, lag), window, axis=1)
+        n, cov, var_x, _, sx, sy = _moments(wx, wy)
+        _, pearson = _pearson(wx, wy)
+        _, log_pearson = _pearson(wlx, wy)
+
+        both = ~(np.isnan(wx) | np.isnan(wy))
+        _, spearman = _pearson(_average_ranks(np.where(both, wx, np.nan)),
+                               _average_ranks(np.where(both, wy, np.nan)))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            slope = cov / var_x
+            intercept = (sy - slope * sx) / n + cy - slope * cx
+
+        enough = n >= min_periods
+        table = {
+            'Country': np.repeat(np.asarray(countries, dtype=object), n_windows),
+            'lag': lag,
+            'start_year': np.tile(starts, len(countries)),
+            'end_year': np.tile(starts + window - 1, len(countries)),
+            'n': n.ravel(),
+        }
+        for name, stat in (('pearson', pearson), ('spearman', spearman),
+                           ('log_pearson', log_pearson), ('slope', slope),
+                           ('intercept', intercept)):
+            table[name] = np.where(enough, stat, np.nan).ravel()
+        tables.append(pd.DataFrame(table, columns=RESULT_COLUMNS))
+    return pd.concat(tables, ignore_index=True)
+
+
+def benchmark(n_countries=(200, 1000), n_years=60, window=10, lags=(0, 1, 2)):
+    """Time `correlations` for all sliding windows and lags."""
+    import time
+    from synthetic import synthetic_panel
+
+    print('%10s %8s %10s %10s' % ('countries', 'rows', 'results', 'seconds'))
+    for n in n_countries:
+        df = synthetic_panel(n, n_years)
+        t0 = time.perf_counter()
+        result = correlations(df, window=window, lags=lags)
+        print('%10d %8d %10d %10.3f' % (n, len(df), len(result), time.perf_counter() - t0))
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,159 @@
+# coding: utf-8
+"""Cached loading of all_data.csv.
+
+Cells In[3] and In[7] re-parse the CSV and rename the life expectancy column
+on every run. `load_data` does both once, with compact dtypes, and stores the
+parsed columns next to the CSV as plain NumPy arrays in a `<name>.cache`
+directory. Later runs load the arrays directly (optionally memory-mapped) as
+long as the CSV has not changed.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+LEABY_COLUMN = 'Life expectancy at birth (years)'
+RENAME = {LEABY_COLUMN: 'LEABY'}
+
+# Dtypes used when parsing, keyed by the raw CSV header.
+CSV_DTYPES = {
+    'Country': 'category',
+    'Year': 'int16',
+    LEABY_COLUMN: 'float32',
+    'GDP': 'float64',
+}
+
+CACHE_VERSION = 1
+_NUMERIC = ('Year', 'LEABY', 'GDP')
+_COLUMNS = ['Country'] + list(_NUMERIC)
+
+
+def read_csv(path, **kwargs):
+    """Parse the CSV with compact dtypes and the In[7] column rename."""
+    df = pd.read_csv(path, dtype=CSV_DTYPES, **kwargs)
+    return df.rename(columns=RENAME)
+
+
+def cache_dir(path):
+    """Directory that holds the binary cache for the CSV at `path`."""
+    return path + '.cache'
+
+
+def file_hash(path, block_size=1 << 20):
+    """SHA-256 of the file contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _source_key(path):
+    st = os.stat(path)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def _read_meta(directory):
+    try:
+        with open(os.path.join(directory, 'meta.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_cache(df, path, source_hash):
+    directory = cache_dir(path)
+    parent = os.path.dirname(os.path.abspath(directory))
+    tmp = tempfile.mkdtemp(prefix='.tmp-', dir=parent)
+    try:
+        country = df['Country'].cat
+        np.save(os.path.join(tmp, 'Country.npy'), np.asarray(country.codes))
+        for name in _NUMERIC:
+            np.save(os.path.join(tmp, name + '.npy'), df[name].to_numpy())
+        meta = dict(_source_key(path), version=CACHE_VERSION, sha256=source_hash,
+                    rows=len(df), countries=[str(c) for c in country.categories])
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        if os.path.isdir(directory):
+            shutil.rmtree(directory)
+        os.replace(tmp, directory)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+
+def _read_cache(directory, meta, mmap):
+    mode = 'r' if mmap else None
+    columns = {}
+    codes = np.load(os.path.join(directory, 'Country.npy'), mmap_mode=mode)
+    columns['Country'] = pd.Categorical.from_codes(codes, categories=meta['countries'])
+    for name in _NUMERIC:
+        columns[name] = np.load(os.path.join(directory, name + '.npy'), mmap_mode=mode)
+    return pd.DataFrame(columns, copy=False)
+
+
+def load_data(path='all_data.csv', use_cache=True, mmap=False):
+    """Return the panel in `path` as a DataFrame with Country, Year, LEABY, GDP.
+
+    The cache is reused while the CSV's size and modification time are
+    unchanged. If only the modification time moved (a fresh checkout, say),
+    the contents are hashed and the cache is kept when they still match.
+    Anything else triggers a re-parse and a rewrite of the cache; if the
+    cache cannot be written the parsed frame is still returned. Other CSV
+    columns are dropped, so a parse and a cache hit give the same frame.
+    """
+    if not use_cache:
+        return _parse(path)
+
+    directory = cache_dir(path)
+    meta = _read_meta(directory)
+    if meta is not None and meta.get('version') == CACHE_VERSION:
+        key = _source_key(path)
+        if meta['size'] == key['size'] and meta['mtime_ns'] == key['mtime_ns']:
+            return _read_cache(directory, meta, mmap)
+        if meta['size'] == key['size'] and meta['sha256'] == file_hash(path):
+            meta.update(key)
+            with open(os.path.join(directory, 'meta.json'), 'w') as f:
+                json.dump(meta, f)
+            return _read_cache(directory, meta, mmap)
+
+    df = _parse(path)
+    try:
+        _write_cache(df, path, file_hash(path))
+    except OSError:
+        # Read-only checkout or full disk: run uncached.
+        pass
+    return df
+
+
+def _parse(path):
+    return read_csv(path, usecols=list(CSV_DTYPES))[_COLUMNS]
+
+
+def compare_timings(path='all_data.csv', repeat=5):
+    """Print best-of-`repeat` load times for plain read_csv and the cache."""
+    import timeit
+
+    def plain():
+        pd.read_csv(path).rename(index=str, columns=RENAME)
+
+    load_data(path)
+    timings = [
+        ('read_csv + rename', plain),
+        ('read_csv, compact dtypes', lambda: read_csv(path)),
+        ('binary cache', lambda: load_data(path)),
+        ('binary cache, mmap', lambda: load_data(path, mmap=True)),
+    ]
+    for label, fn in timings:
+        best = min(timeit.repeat(fn, number=1, repeat=repeat))
+        print('%-26s %10.4f s' % (label, best))
+
+
+if __name__ == '__main__':
+    import sys
+    compare_timings(*sys.argv[1:2])
@@ -0,0 +1,230 @@
+# coding: utf-8
+"""Point reduction and pagination for FacetGrid charts of large panels.
+
+In[22] draws one facet per year with every country as a scatter point and
+its own legend entry; In[23] to In[27] draw one line facet per country. At
+200 countries x 60 years that is tens of thousands of artists in a single
+figure. With `FacetLimits`, `render.render_all` reduces each facet chart
+before drawing:
+
+- hue levels beyond the `top_n` with the highest mean y are merged into
+  'Other', so the legend and palette stay readable;
+- line series longer than their share of `max_points` are cut down with
+  Largest-Triangle-Three-Buckets, which keeps the visual shape;
+- scatter facets with more than `max_points` points are binned on a grid,
+  one point per occupied cell and hue at the cell's mean position;
+- facets are split into pages of at most `max_facets`, each written to its
+  own file (`<chart>_p01.png`, `<chart>_p02.png`, ...).
+
+    python downsample.py --countries 200 --years 60
+"""
+
+import argparse
+import collections
+
+import numpy as np
+import pandas as pd
+
+OTHER = 'Other'
+
+FacetLimits = collections.namedtuple('FacetLimits', ['max_facets', 'max_points', 'top_n'])
+FacetLimits.__new__.__defaults__ = (24, 500, 10)
+FacetLimits.__doc__ = """Caps applied to facet charts; None disables a cap.
+
+`max_facets` is per page, `max_points` per facet and `top_n` the number of
+hue levels kept before the rest become 'Other'.
+"""
+
+
+def lttb(x, y, threshold):
+    """Indices of the `threshold` points of (x, y) chosen by LTTB.
+
+    `x` must be sorted. The first and last points are always kept; with
+    `threshold` >= len(x) every index is returned.
+    """
+    n = len(x)
+    if threshold >= n:
+        return np.arange(n)
+    if threshold < 3:
+        raise ValueError('LTTB needs a threshold of at least 3 points')
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    # Bucket edges for the n - 2 interior points.
+    edges = (np.arange(threshold - 1) * (n - 2) / (threshold - 2)).astype(np.intp) + 1
+    edges[-1] = n - 1
+    keep = np.empty(threshold, dtype=np.intp)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_lo, nxt_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        cx = x[nxt_lo:nxt_hi].mean()
+        cy = y[nxt_lo:nxt_hi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def top_hues(data, hue, y, top_n):
+    """`data` with hue levels outside the `top_n` highest mean `y` set to 'Other'.
+
+    The hue column comes back categorical with a fixed set of levels, so
+    every page of a chart uses the same colors.
+    """
+    means = data.groupby(hue, observed=True)[y].mean().sort_values(ascending=False)
+    if len(means) <= top_n:
+        return data
+    kept = list(means.index[:top_n])
+    labels = data[hue].astype(object).where(data[hue].isin(kept), OTHER)
+    return data.assign(**{hue: pd.Categorical(labels, categories=kept + [OTHER])})
+
+
+def _reduce_lines(data, spec, max_points):
+    # LTTB on every (facet, hue) series, sharing `max_points` per facet.
+    keys = [c for c in (spec.col, spec.hue) if c is not None]
+    data = data.sort_values(keys + [spec.x], kind='mergesort')
+    if not keys:
+        return data.iloc[lttb(data[spec.x].to_numpy(dtype='float64'),
+                              data[spec.y].to_numpy(dtype='float64'), max_points)]
+    if spec.hue is None:
+        n_series = None
+    elif spec.col is None:
+        n_series = data[spec.hue].nunique()
+    else:
+        n_series = data.groupby(spec.col, observed=True)[spec.hue].nunique()
+    parts = []
+    for key, rows in data.groupby(keys, sort=False, observed=True):
+        if n_series is None:
+            budget = max_points
+        elif spec.col is None:
+            budget = max_points // n_series
+        else:
+            budget = max_points // n_series[key[0]]
+        keep = lttb(rows[spec.x].to_numpy(dtype='float64'),
+                    rows[spec.y].to_numpy(dtype='float64'), max(budget, 3))
+        parts.append(rows.iloc[keep])
+    return pd.concat(parts)
+
+
+def _reduce_scatter(data, spec, max_points):
+    keys = [c for c in (spec.col, spec.hue) if c is not None]
+    sizes = data.groupby(spec.col, observed=True).size() if spec.col else pd.Series([len(data)])
+    if sizes.max() <= max_points:
+        return data
+    cells = max(2, int(np.sqrt(max_points)))
+    x = data[spec.x].to_numpy(dtype='float64')
+    y = data[spec.y].to_numpy(dtype='float64')
+
+    def grid(v):
+        lo, hi = np.nanmin(v), np.nanmax(v)
+        span = hi - lo if hi > lo else 1.0
+        return np.minimum(((v - lo) / span * cells).astype(np.intp), cells - 1)
+
+    binned = data.assign(_bx=grid(x), _by=grid(y))
+    out = binned.groupby(keys + ['_bx', '_by'], observed=True, sort=True).agg(
+        **{spec.x: (spec.x, 'mean'), spec.y: (spec.y, 'mean')})
+    return out.reset_index().drop(columns=['_bx', '_by'])
+
+
+def reduce_facet(data, spec, limits):
+    """Facet chart data with the hue and point caps of `limits` applied."""
+    if spec.hue is not None and limits.top_n is not None:
+        merged = top_hues(data, spec.hue, spec.y, limits.top_n)
+        if merged is not data and spec.plot != 'scatter':
+            # One 'Other' line: the mean over the merged series.
+            keys = [c for c in (spec.col, spec.hue, spec.x) if c is not None]
+            merged = merged.groupby(keys, observed=True, sort=True)[spec.y].mean().reset_index()
+        data = merged
+    if limits.max_points is not None and len(data):
+        if spec.plot == 'scatter':
+            data = _reduce_scatter(data, spec, limits.max_points)
+        else:
+            data = _reduce_lines(data, spec, limits.max_points)
+    return data
+
+
+def paginate(data, spec, max_facets):
+    """Split facet chart data into pages of at most `max_facets` facets.
+
+    Returns a list of (spec, data) pairs. A single page keeps the chart's
+    name; otherwise pages are named `<name>_p01`, `<name>_p02`, ...
+    """
+    if spec.col is None or max_facets is None:
+        return [(spec, data)]
+    column = data[spec.col]
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        levels = [c for c in column.cat.categories if c in set(column)]
+    else:
+        levels = sorted(column.unique())
+    if len(levels) <= max_facets:
+        return [(spec, data)]
+    pages = []
+    for number, first in enumerate(range(0, len(levels), max_facets), 1):
+        page_levels = levels[first:first + max_facets]
+        rows = data[column.isin(page_levels)]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            rows = rows.assign(**{spec.col: rows[spec.col].cat.set_categories(page_levels)})
+        title = spec.title and '%s (%d/%d)' % (spec.title, number,
+                                               -(-len(levels) // max_facets))
+        pages.append((spec._replace(name='%s_p%02d' % (spec.name, number), title=title), rows))
+    return pages
+
+
+def benchmark(n_countries=200, n_years=60, limits=FacetLimits(), full=False, out_dir=None):
+    """Render the facet charts of a synthetic panel with and without limits.
+
+    The unreduced charts are only drawn with `full=True`: at 200 countries
+    the In[22] grid alone takes minutes.
+    """
+    import os
+    import shutil
+    import tempfile
+    import time
+
+    import render
+    from growth_metrics import add_growth_columns
+    from synthetic import synthetic_panel
+
+    df = synthetic_panel(n_countries, n_years, first_year=2000)
+    df = df.assign(Country=df['Country'].astype('category'))
+    panel = add_growth_columns(df, base_year=2000)
+    specs = [s for s in render.CHARTS if s.kind == 'facet']
+    own_dir = out_dir is None
+    out_dir = out_dir or tempfile.mkdtemp(prefix='le-gdp-facets-')
+    modes = [('limited', limits)] + ([('full', None)] if full else [])
+    print('%-28s %-8s %6s %10s %10s' % ('chart', 'mode', 'files', 'seconds', 'KB'))
+    try:
+        for mode, mode_limits in modes:
+            directory = os.path.join(out_dir, mode)
+            for spec in specs:
+                t0 = time.perf_counter()
+                status = render.render_all(panel, [spec], directory, workers=1, force=True,
+                                           limits=mode_limits)
+                elapsed = time.perf_counter() - t0
+                files = [os.path.join(directory, name + '.png') for name in status
+                         if status[name] == 'rendered']
+                size = sum(os.path.getsize(f) for f in files) / 1024.0
+                print('%-28s %-8s %6d %10.2f %10.0f' % (spec.name, mode, len(files), elapsed,
+                                                        size))
+    finally:
+        if own_dir:
+            shutil.rmtree(out_dir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--countries', type=int, default=200)
+    parser.add_argument('--years', type=int, default=60)
+    parser.add_argument('--max-facets', type=int, default=FacetLimits().max_facets)
+    parser.add_argument('--max-points', type=int, default=FacetLimits().max_points)
+    parser.add_argument('--top-n', type=int, default=FacetLimits().top_n)
+    parser.add_argument('--full', action='store_true', help='also render without limits')
+    parser.add_argument('--out', help='keep the figures in this directory')
+    args = parser.parse_args(argv)
+    benchmark(args.countries, args.years,
+              FacetLimits(args.max_facets, args.max_points, args.top_n), args.full, args.out)
+
+
+if __name__ == '__main__':
+    main()
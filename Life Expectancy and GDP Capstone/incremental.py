@@ -0,0 +1,162 @@
+# coding: utf-8
+"""Incremental updates of the derived panel when new years are published.
+
+Rerunning the notebook for one extra year of World Bank data recomputes the
+In[15] growth columns and the chart inputs for every row. `IncrementalPanel`
+keeps the derived frame and the per-country sums behind the bar-chart means
+on disk, accepts only (Country, Year) rows it has not seen, and recomputes
+the derived columns just for the rows those additions touch:
+
+- the new rows themselves;
+- the next existing row of the same country, whose prior year changed;
+- every row of a country that gains its base-year row.
+
+Charts are then re-rendered with `render.render_all`, whose manifest skips
+every chart whose inputs did not change.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from growth_metrics import add_growth_columns
+from panel import Panel
+
+VALUES = ('GDP', 'LEABY')
+
+
+def _totals(rows):
+    # Per-country sums and counts of VALUES. float32 LEABY is widened before
+    # summing so the running means match a float64 recomputation.
+    rows = rows[['Country'] + list(VALUES)].astype(dict.fromkeys(VALUES, 'float64'))
+    grouped = rows.groupby('Country', sort=True, observed=True)[list(VALUES)]
+    return grouped.sum(), grouped.count()
+
+
+class IncrementalPanel(object):
+    """Derived country/year panel that can be extended in place."""
+
+    def __init__(self, frame, base_year, value='GDP', sums=None, counts=None):
+        self.frame = frame
+        self.base_year = base_year
+        self.value = value
+        if sums is None:
+            sums, counts = _totals(frame)
+        self.sums = sums
+        self.counts = counts
+
+    @property
+    def base_column(self):
+        return '%s_in_%d' % (self.value, self.base_year)
+
+    @property
+    def base_growth_column(self):
+        return 'percent_growth_%ds' % self.base_year
+
+    @classmethod
+    def build(cls, df, base_year=None, value='GDP'):
+        """Compute the full derived panel from raw Country/Year/LEABY/GDP rows."""
+        if base_year is None:
+            base_year = int(df['Year'].min())
+        frame = add_growth_columns(Panel(df), value, base_year=base_year)
+        return cls(frame.reset_index(drop=True), base_year, value)
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+        return cls(pd.read_pickle(os.path.join(directory, 'frame.pkl')),
+                   meta['base_year'], meta['value'],
+                   pd.read_pickle(os.path.join(directory, 'sums.pkl')),
+                   pd.read_pickle(os.path.join(directory, 'counts.pkl')))
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name, obj in (('frame', self.frame), ('sums', self.sums), ('counts', self.counts)):
+            path = os.path.join(directory, name + '.pkl')
+            obj.to_pickle(path + '.tmp')
+            os.replace(path + '.tmp', path)
+        with open(os.path.join(directory, 'meta.json'), 'w') as f:
+            json.dump({'base_year': self.base_year, 'value': self.value}, f)
+
+    def country_means(self):
+        """Per-country means of GDP and LEABY (the In[9]/In[10] bar heights)."""
+        return self.sums / self.counts
+
+    def append(self, rows):
+        """Add rows for (Country, Year) pairs not yet in the panel.
+
+        Raises ValueError if any pair is already present or repeated in
+        `rows`. Returns the sorted list of countries whose rows changed.
+        """
+        rows = rows[['Country', 'Year'] + list(VALUES)]
+        if rows.empty:
+            return []
+        new_keys = pd.MultiIndex.from_frame(rows[['Country', 'Year']].astype({'Country': object}))
+        old_keys = pd.MultiIndex.from_frame(
+            self.frame[['Country', 'Year']].astype({'Country': object}))
+        if new_keys.duplicated().any() or new_keys.isin(old_keys).any():
+            raise ValueError('rows must only contain new (Country, Year) pairs')
+
+        frame = pd.concat([self.frame.assign(_new=False), rows.assign(_new=True)],
+                          ignore_index=True)
+        # Re-coded so new countries get categories and codes stay compact.
+        frame['Country'] = frame['Country'].astype(object).astype('category')
+        frame = frame.sort_values(['Country', 'Year'], kind='mergesort').reset_index(drop=True)
+
+        country = frame['Country'].to_numpy(dtype=object)
+        new = frame.pop('_new').to_numpy(dtype=bool)
+        same_as_prev = np.r_[False, country[1:] == country[:-1]]
+        affected = new | (np.r_[False, new[:-1]] & same_as_prev)
+        rebased = rows.loc[rows['Year'] == self.base_year, 'Country']
+        affected |= np.isin(country, rebased.to_numpy(dtype=object))
+
+        idx = np.flatnonzero(affected)
+        first = ~same_as_prev[idx]
+        years = frame['Year'].to_numpy()
+        values = frame[self.value].to_numpy(dtype='float64')
+        # The previous row only counts as the prior year if it is one year
+        # earlier; after a gap the prior value is unknown.
+        has_prior = ~first & (years[idx - 1] == years[idx] - 1)
+        prior = np.where(has_prior, values[idx - 1], np.nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            growth = np.where(first, 0.0, values[idx] / prior * 100.0)
+
+        at_base = frame['Year'].to_numpy() == self.base_year
+        bases = pd.Series(values[at_base], index=country[at_base])
+        base = pd.Series(country[idx]).map(bases).to_numpy(dtype='float64')
+
+        frame.loc[idx, 'prior_year_' + self.value] = np.where(first, 0.0, prior)
+        frame.loc[idx, 'percent_growth'] = growth
+        frame.loc[idx, self.base_column] = base
+        frame.loc[idx, self.base_growth_column] = values[idx] / base * 100.0
+        self.frame = frame
+
+        sums, counts = _totals(rows)
+        self.sums = self.sums.add(sums, fill_value=0.0)
+        self.counts = self.counts.add(counts, fill_value=0).astype('int64')
+        return sorted(set(country[idx]))
+
+
+def update(state_dir, rows, data_path=None, out_dir=None, **render_kwargs):
+    """Append `rows` to the persisted panel in `state_dir` and save it.
+
+    The state is built from `data_path` on first use. With `out_dir` set,
+    charts are re-rendered there; unchanged charts are skipped. Returns the
+    list of countries whose rows changed.
+    """
+    if os.path.exists(os.path.join(state_dir, 'meta.json')):
+        state = IncrementalPanel.load(state_dir)
+    else:
+        from data_loader import load_data
+        state = IncrementalPanel.build(load_data(data_path or 'all_data.csv'))
+    changed = state.append(rows)
+    state.save(state_dir)
+    if out_dir is not None:
+        from normalize import normalize
+        from render import render_all
+        frame = normalize(state.frame, 'LEABY', 'index', base_year=state.base_year)
+        render_all(frame, out_dir=out_dir, **render_kwargs)
+    return changed
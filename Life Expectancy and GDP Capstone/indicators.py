@@ -0,0 +1,232 @@
+# coding: utf-8
+"""Country/year panels of any number of indicators.
+
+The notebook only knows GDP and LEABY, both read from all_data.csv. Here
+every indicator file (health spend, mortality, population, ...) is a
+long-format CSV with Country, Year and one or more value columns, and
+`align` lays all of them out on one shared (Country, Year) index instead of
+chaining `pd.merge` calls:
+
+- every (country, year) pair is mapped to an integer key,
+  country code * number of years + year offset;
+- the union of keys is a boolean mask over all possible keys, so the
+  aligned rows come out sorted by country and year with no sorting;
+- each indicator's values are scattered into their rows in one step.
+
+`IndicatorPanel` then offers the growth columns, bar-chart summaries and
+charts of the notebook for any indicator by name.
+
+    panel = IndicatorPanel.from_files(['all_data.csv', 'health_spend.csv'])
+    panel.growth('health_spend', base_year=2000)
+    panel.render(out_dir='figures', indicators=['health_spend'])
+"""
+
+import numpy as np
+import pandas as pd
+
+from panel import Panel
+
+
+def read_indicator(path, country='Country', year='Year'):
+    """One indicator CSV, with the notebook's LEABY rename applied.
+
+    Raises ValueError if the file has no `country` or `year` column.
+    """
+    from data_loader import RENAME
+
+    df = pd.read_csv(path).rename(columns=RENAME)
+    missing = [c for c in (country, year) if c not in df.columns]
+    if missing:
+        raise ValueError('%s has no %s column' % (path, ' or '.join(missing)))
+    return df
+
+
+def value_columns(df, country='Country', year='Year'):
+    """Names of the indicator columns of `df`: everything but the keys."""
+    return [c for c in df.columns if c not in (country, year)]
+
+
+def align(frames, country='Country', year='Year'):
+    """Outer-align indicator frames on (Country, Year).
+
+    Returns one frame with a categorical `country` column, an integer
+    `year` column and every value column of every frame as float64, sorted
+    by country and year with a RangeIndex. Pairs missing from a frame are
+    NaN. Raises ValueError if a country or year is missing, a pair appears
+    twice in one frame or two frames share a value column.
+    """
+    frames = list(frames)
+    names = [c for df in frames for c in value_columns(df, country, year)]
+    repeated = sorted(set(c for c in names if names.count(c) > 1))
+    if repeated:
+        raise ValueError('indicator columns appear in more than one frame: %s'
+                         % ', '.join(map(str, repeated)))
+    for df in frames:
+        for key in (country, year):
+            if df[key].isna().any():
+                raise ValueError('%s has missing values' % key)
+    if not any(len(df) for df in frames):
+        out = {country: pd.Categorical([]), year: np.array([], dtype=np.int64)}
+        out.update((name, np.array([], dtype='float64')) for name in names)
+        return pd.DataFrame(out)
+
+    # Factorize each frame once; only its few distinct names are looked up.
+    factorized = [pd.factorize(df[country]) for df in frames]
+    countries = pd.Index(sorted(set().union(*(names for _, names in factorized))))
+    first = min(int(df[year].min()) for df in frames if len(df))
+    last = max(int(df[year].max()) for df in frames if len(df))
+    span = last - first + 1
+    size = len(countries) * span
+
+    keys = []
+    present = np.zeros(size, dtype=bool)
+    for df, (local, names) in zip(frames, factorized):
+        codes = countries.get_indexer(names)[local]
+        key = codes.astype(np.int64) * span + (df[year].to_numpy(dtype=np.int64) - first)
+        if np.bincount(key, minlength=size).max(initial=0) > 1:
+            raise ValueError('(%s, %s) pairs must be unique within each frame' % (country, year))
+        present[key] = True
+        keys.append(key)
+
+    union = np.flatnonzero(present)
+    row_of_key = np.cumsum(present) - 1
+    out = {
+        country: pd.Categorical.from_codes(union // span, categories=countries),
+        year: union % span + first,
+    }
+    for df, key in zip(frames, keys):
+        rows = row_of_key[key]
+        for name in value_columns(df, country, year):
+            column = np.full(len(union), np.nan)
+            column[rows] = df[name].to_numpy(dtype='float64', na_value=np.nan)
+            out[name] = column
+    return pd.DataFrame(out)
+
+
+class IndicatorPanel(object):
+    """Aligned country/year panel with per-indicator analyses."""
+
+    def __init__(self, frame, indicators=None, country='Country', year='Year'):
+        self.panel = Panel(frame, country, year)
+        if indicators is None:
+            indicators = value_columns(frame, country, year)
+        self.indicators = list(indicators)
+
+    @classmethod
+    def from_frames(cls, frames, country='Country', year='Year'):
+        return cls(align(frames, country, year), country=country, year=year)
+
+    @classmethod
+    def from_files(cls, paths, country='Country', year='Year'):
+        return cls.from_frames([read_indicator(p, country, year) for p in paths], country, year)
+
+    @property
+    def frame(self):
+        return self.panel.frame
+
+    def _check(self, indicator):
+        if indicator not in self.indicators:
+            raise KeyError('no indicator %r' % (indicator,))
+
+    def rows(self, indicator):
+        """Country, year and `indicator` for the pairs where it is present."""
+        self._check(indicator)
+        columns = [self.panel.country_column, self.panel.year_column, indicator]
+        frame = self.frame[columns]
+        return frame[frame[indicator].notna()]
+
+    def growth(self, indicator, base_year=None):
+        """The In[15] growth columns of `indicator` (see `add_growth_columns`)."""
+        from growth_metrics import add_growth_columns
+
+        return add_growth_columns(Panel(self.rows(indicator), self.panel.country_column,
+                                        self.panel.year_column),
+                                  indicator, self.panel.country_column, self.panel.year_column,
+                                  base_year)
+
+    def summary(self, indicator, by=None, cache=None, **kwargs):
+        """Mean and bootstrap CI of `indicator` per country (or per `by`)."""
+        from aggregation import summarize
+
+        self._check(indicator)
+        by = [self.panel.country_column] if by is None else list(by)
+        return summarize(self.panel, indicator, by, cache=cache, **kwargs)
+
+    def summaries(self, indicators=None, by=None, cache=None, **kwargs):
+        """`summary` of several indicators stacked, with an `indicator` column."""
+        tables = [self.summary(name, by, cache, **kwargs).assign(indicator=name)
+                  for name in (self.indicators if indicators is None else indicators)]
+        return pd.concat(tables, ignore_index=True)
+
+    def chart_specs(self, indicators=None):
+        """Per indicator, the In[9] bar chart and the In[27] per-country facet."""
+        from render import ChartSpec
+
+        country, year = self.panel.country_column, self.panel.year_column
+        specs = []
+        for name in (self.indicators if indicators is None else indicators):
+            self._check(name)
+            specs.append(ChartSpec('%s_bar' % name, 'bar', country, name, palette='Set2',
+                                   title='%s by Country' % name, xlabel=country, ylabel=name))
+            specs.append(ChartSpec('%s_facet' % name, 'facet', year, name, col=country,
+                                   title='%s Yearly by Country' % name))
+        return specs
+
+    def render(self, out_dir='figures', indicators=None, **kwargs):
+        """`render.render_all` over `chart_specs(indicators)`."""
+        from render import render_all
+
+        return render_all(self.panel, self.chart_specs(indicators), out_dir, **kwargs)
+
+
+def synthetic_indicators(n_indicators=50, n_countries=200, n_years=60, missing=0.1, seed=0):
+    """One shuffled frame per indicator, each missing a random share of pairs."""
+    from synthetic import synthetic_panel
+
+    rng = np.random.default_rng(seed)
+    keys = synthetic_panel(n_countries, n_years, seed=seed)[['Country', 'Year']]
+    frames = []
+    for i in range(n_indicators):
+        keep = rng.random(len(keys)) >= missing
+        frame = keys[keep].assign(**{'indicator_%02d' % i: rng.lognormal(size=int(keep.sum()))})
+        frames.append(frame.sample(frac=1.0, random_state=i).reset_index(drop=True))
+    return frames
+
+
+def _merged(frames, country='Country', year='Year'):
+    # The repeated-merge baseline for the benchmark.
+    out = frames[0]
+    for df in frames[1:]:
+        out = out.merge(df, on=[country, year], how='outer')
+    return out.sort_values([country, year]).reset_index(drop=True)
+
+
+def benchmark(n_indicators=(10, 50, 100), n_countries=200, n_years=60):
+    """Time `align` against chained `pd.merge`, then growth and summaries."""
+    import time
+
+    print('%10s %8s %10s %10s %10s %10s' % ('indicators', 'rows', 'align s', 'merge s',
+                                            'growth s', 'summary s'))
+    for n in n_indicators:
+        frames = synthetic_indicators(n, n_countries, n_years)
+        t0 = time.perf_counter()
+        aligned = align(frames)
+        t1 = time.perf_counter()
+        merged = _merged(frames)
+        t2 = time.perf_counter()
+        assert np.allclose(aligned[merged.columns[2:]].to_numpy(),
+                           merged[merged.columns[2:]].to_numpy(), equal_nan=True)
+
+        panel = IndicatorPanel(aligned)
+        t3 = time.perf_counter()
+        for name in panel.indicators:
+            panel.growth(name)
+        t4 = time.perf_counter()
+        panel.summaries(n_boot=200)
+        t5 = time.perf_counter()
+        print('%10d %8d %10.3f %10.3f %10.3f %10.3f'
+              % (n, len(aligned), t1 - t0, t2 - t1, t4 - t3, t5 - t4))
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,141 @@
+# coding: utf-8
+"""Opt-in timing and profiling of pipeline stages.
+
+    tracer = Tracer(profile_dir='profiles')
+    with tracer.stage('growth', rows=len(df)):
+        ...
+    tracer.write('trace.json')
+
+Every stage records wall and CPU time, the change in resident memory and an
+optional row count; nested stages name their parent. With `profile_dir`
+set, each top-level stage also runs under cProfile and its stats are dumped
+to `<profile_dir>/<stage>.prof` (readable with `python -m pstats`). Code
+that takes a tracer defaults to `NULL_TRACER`, which records nothing.
+"""
+
+import contextlib
+import cProfile
+import datetime
+import json
+import os
+import platform
+import re
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    _PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = None
+
+
+def rss_bytes():
+    """Current resident set size of this process, or None if unknown."""
+    if _PAGE_SIZE is None:
+        return None
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss_bytes():
+    """High-water resident set size of this process, or None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Tracer(object):
+    """Collects one record per stage and writes them as a JSON trace."""
+
+    enabled = True
+
+    def __init__(self, profile_dir=None):
+        self.profile_dir = profile_dir
+        self.records = []
+        self.started = datetime.datetime.now(datetime.timezone.utc)
+        self._stack = []
+        self._t0 = time.perf_counter()
+
+    @contextlib.contextmanager
+    def stage(self, name, rows=None, **fields):
+        """Time the enclosed block as stage `name`.
+
+        Yields the record dict, so the block can fill in `rows` or other
+        fields once it knows them.
+        """
+        record = dict(fields, name=name, rows=rows,
+                      parent=self._stack[-1] if self._stack else None)
+        profiler = None
+        if self.profile_dir is not None and not self._stack:
+            profiler = cProfile.Profile()
+        self._stack.append(name)
+        rss0 = rss_bytes()
+        start = time.perf_counter()
+        cpu0 = time.process_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield record
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            record['start_s'] = start - self._t0
+            record['wall_s'] = time.perf_counter() - start
+            record['cpu_s'] = time.process_time() - cpu0
+            rss1 = rss_bytes()
+            record['rss_bytes'] = rss1
+            known = rss1 is not None and rss0 is not None
+            record['rss_delta_bytes'] = rss1 - rss0 if known else None
+            if profiler is not None:
+                os.makedirs(self.profile_dir, exist_ok=True)
+                path = os.path.join(self.profile_dir, re.sub(r'[^\w.-]', '_', name) + '.prof')
+                profiler.dump_stats(path)
+                record['profile'] = path
+            self._stack.pop()
+            self.records.append(record)
+
+    def record(self, name, **fields):
+        """Add a record measured elsewhere, e.g. in a worker process."""
+        fields.setdefault('parent', self._stack[-1] if self._stack else None)
+        fields.setdefault('start_s', time.perf_counter() - self._t0 - fields.get('wall_s', 0.0))
+        self.records.append(dict(fields, name=name))
+
+    def to_dict(self):
+        return {
+            'started': self.started.isoformat(),
+            'host': platform.node(),
+            'python': platform.python_version(),
+            'argv': sys.argv,
+            'total_wall_s': time.perf_counter() - self._t0,
+            'peak_rss_bytes': peak_rss_bytes(),
+            'stages': sorted(self.records, key=lambda r: r.get('start_s', 0.0)),
+        }
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=1, default=str)
+
+
+class _NullTracer(object):
+    """Tracer stand-in that records nothing."""
+
+    enabled = False
+
+    @contextlib.contextmanager
+    def stage(self, name, rows=None, **fields):
+        yield {}
+
+    def record(self, name, **fields):
+        pass
+
+
+NULL_TRACER = _NullTracer()
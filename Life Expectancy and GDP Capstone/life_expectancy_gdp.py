@@ -1,5 +1,6 @@
 
 # coding: utf-8
+from __future__ import division
 
 # # Introduction
 # 
@@ -31,13 +32,13 @@
 # In[1]:
 
 from matplotlib import pyplot as plt
-import pandas as pd
 import seaborn as sns
 
 
 # In[2]:
 
-from __future__ import division
+# `from __future__ import division` has to be the first statement of a
+# module, so it now sits at the top of this file.
 
 
 # ## Step 2 Prep The Data
@@ -51,7 +52,11 @@ from __future__ import division
 
 # In[3]:
 
-df = pd.read_csv('all_data.csv')
+from data_loader import load_data
+
+# Parses the CSV once and reuses the binary cache in all_data.csv.cache
+# afterwards; the LEABY rename from In[7] is applied on load.
+df = load_data('all_data.csv')
 df.head()
 
 
@@ -98,7 +103,15 @@ df.head()
 
 # In[7]:
 
-df = df.rename(index = str, columns = {"Life expectancy at birth (years)": "LEABY"})
+# load_data() has already renamed the column; kept for CSVs read directly.
+# The index stays a RangeIndex rather than strings (index = str), which
+# costs several bytes per row on large panels.
+df = df.rename(columns = {"Life expectancy at birth (years)": "LEABY"})
+
+from panel import Panel
+
+# Sorted by Country and Year once; panel.country(name) is a slice, not a scan.
+panel = Panel(df)
 
 
 # In[8]:
@@ -195,7 +208,7 @@ plt.show()
 # In[13]:
 
 f, ax = plt.subplots(figsize=(10, 8)) 
-ax = sns.barplot(x = "Country", y = "GDP", data = df[df['Country']=='Zimbabwe'], hue = "Year")
+ax = sns.barplot(x = "Country", y = "GDP", data = panel.country('Zimbabwe'), hue = "Year", order = ['Zimbabwe'])
 plt.xticks(rotation = 0)
 plt.ylabel("GDP in 10s of Trillions of U.S. Dollars")
 plt.title("Year Trend of GDP in 10s of Trillions of U.S. Dollars in Zimbabwe")
@@ -206,52 +219,19 @@ plt.show()
 # In[14]:
 
 #Country GDP in 2000
-for country in country_list:
-    df_c = df[df['Country']==country]
-    df_cg = df_c.groupby(by='Year')['GDP'].mean().reset_index()
-    diff_cg = df_cg.iloc[0]['GDP']
+for country, df_c in panel:
+    diff_cg = df_c['GDP'].iloc[0]
     print(country )
     print(str(diff_cg)+'\n')
 
 
 # In[15]:
 
-df_c = df
-df_c['prior_year_GDP'] = 0
-df_c['percent_growth'] = 0
-df_c['GDP_in_2000'] = 0
-df_c['percent_growth_2000s'] = 0
-
-for i in range(0,len(df_c)):
-    if df_c['Country'][i] == 'Chile':
-        df_c['GDP_in_2000'][i] = 77860932152.0
-    if df_c['Country'][i] == 'China':
-        df_c['GDP_in_2000'][i] = 1211350000000.0
-    if df_c['Country'][i] == 'Germany':
-        df_c['GDP_in_2000'][i] = 1949950000000.0
-    if df_c['Country'][i] == 'Mexico':
-        df_c['GDP_in_2000'][i] = 683648000000.0
-    if df_c['Country'][i] == 'United States of America':
-        df_c['GDP_in_2000'][i] = 10300000000000.0
-    if df_c['Country'][i] == 'Zimbabwe':
-        df_c['GDP_in_2000'][i] = 6689957600.0
-
-
-for i in range(0,len(df_c)):
-    if df_c['Year'][i]==2000:
-        p_gdp = 0
-        df_c['percent_growth_2000s'][i] = 1       
-    else:
-        p_gdp = df_c['GDP'][i-1]                
-    df_c['prior_year_GDP'][i] = p_gdp
-
-df_c['percent_growth'] = df_c['GDP']/df_c['prior_year_GDP'] * 100.0
-df_c['percent_growth_2000s'] = df_c['GDP']/df_c['GDP_in_2000'] * 100.0
-
-for i in range(0,len(df_c)):
-    if df_c['Year'][i]==2000:
-        df_c['percent_growth'][i]=0
-   
+from growth_metrics import add_growth_columns
+
+# prior_year_GDP, percent_growth, GDP_in_2000 and percent_growth_2000s,
+# with each country's 2000 GDP taken from the data.
+df_c = add_growth_columns(panel, base_year=2000)
 
 
 # In[16]:
@@ -315,7 +295,7 @@ plt.show()
 # In[20]:
 
 f, ax = plt.subplots(figsize=(10, 8)) 
-ax = sns.barplot(x = "Country", y = "LEABY", data = df[df['Country']=='Zimbabwe'], hue = "Year")
+ax = sns.barplot(x = "Country", y = "LEABY", data = panel.country('Zimbabwe'), hue = "Year", order = ['Zimbabwe'])
 plt.xticks(rotation = 0)
 plt.ylabel("Life expectancy at birth in years")
 plt.title('Life Expectancy at Birth Trend')
@@ -325,8 +305,11 @@ plt.show()
 
 # In[21]:
 
-df_z = df[df['Country']=='Zimbabwe']
-df_z['LEABY_change'] = df_z['LEABY']/46 * 100.0
+from normalize import normalize
+
+# LEABY as a percentage of the 2000 value (46 for Zimbabwe), from the data.
+df_z = normalize(panel, 'LEABY', 'index', base_year=2000, countries=['Zimbabwe'])
+df_z = df_z.rename(columns={'LEABY_index': 'LEABY_change'})
 df_z
 
 
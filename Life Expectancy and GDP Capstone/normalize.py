@@ -0,0 +1,92 @@
+# coding: utf-8
+"""Per-country normalization of indicators, with baselines taken from the data.
+
+In[21] computes Zimbabwe's `LEABY_change` as `LEABY / 46 * 100`, 46 being
+its life expectancy in 2000 typed in by hand, and the original In[15] did
+the same with each country's 2000 GDP. `normalize` derives every baseline
+from the panel itself, for any indicators, countries and base year:
+
+- 'index': value as a percentage of the country's base-year value (of its
+  first year on record with `base_year=None`), the In[21] `LEABY_change`;
+- 'zscore': standard deviations from the country's mean;
+- 'minmax': position between the country's minimum (0) and maximum (1).
+
+All columns and countries are handled in one pass over a (rows, columns)
+array with per-country reductions at the panel's offsets.
+"""
+
+import numpy as np
+
+from panel import as_panel
+
+METHODS = ('index', 'zscore', 'minmax')
+
+
+def normalize_values(values, years, starts, stops, method='index', base_year=None):
+    """Normalize a (rows, columns) float array country by country.
+
+    Rows are sorted by country and year; `starts`/`stops` are each
+    country's row offsets. NaN values are ignored and stay NaN; countries
+    without a base-year value get NaN under 'index'.
+    """
+    if method not in METHODS:
+        raise ValueError('method must be one of %s, got %r' % (', '.join(METHODS), method))
+    values = np.asarray(values, dtype='float64')
+    if values.ndim == 1:
+        return normalize_values(values[:, None], years, starts, stops, method, base_year)[:, 0]
+    out = np.full_like(values, np.nan)
+    if not len(starts):
+        return out
+    lengths = stops - starts
+    valid = ~np.isnan(values)
+
+    def spread(per_country):
+        return np.repeat(per_country, lengths, axis=0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if method == 'index':
+            country = np.repeat(np.arange(len(starts)), lengths)
+            in_base = valid if base_year is None else valid & (years == base_year)[:, None]
+            base = np.full((len(starts), values.shape[1]), np.nan)
+            for j in range(values.shape[1]):
+                hits = np.flatnonzero(in_base[:, j])
+                owners, first = np.unique(country[hits], return_index=True)
+                base[owners, j] = values[hits[first], j]
+            out = values / spread(base) * 100.0
+        elif method == 'zscore':
+            count = np.add.reduceat(valid, starts, axis=0)
+            mean = np.add.reduceat(np.where(valid, values, 0.0), starts, axis=0) / count
+            centred = np.where(valid, values - spread(mean), 0.0)
+            std = np.sqrt(np.add.reduceat(centred * centred, starts, axis=0) / (count - 1))
+            out = (values - spread(mean)) / spread(std)
+        else:
+            low = np.fmin.reduceat(values, starts, axis=0)
+            high = np.fmax.reduceat(values, starts, axis=0)
+            out = (values - spread(low)) / spread(high - low)
+    return out
+
+
+def normalize(data, columns, methods='index', base_year=None, countries=None,
+              country='Country', year='Year'):
+    """Rows of `data` with normalized copies of `columns` added.
+
+    `methods` is one name from METHODS or a list of them; each adds a
+    `<column>_<method>` column. `countries` limits the result to those
+    countries (baselines are per country, so this does not change the
+    values). Rows come back in (Country, Year) order.
+    """
+    panel = as_panel(data, country, year)
+    columns = [columns] if isinstance(columns, str) else list(columns)
+    methods = [methods] if isinstance(methods, str) else list(methods)
+    if countries is not None:
+        panel = as_panel(panel.select(list(countries)), country, year)
+    frame = panel.frame
+    values = frame[columns].to_numpy(dtype='float64', na_value=np.nan)
+    years = frame[year].to_numpy()
+
+    added = {}
+    for method in methods:
+        result = normalize_values(values, years, panel.starts, panel.stops, method, base_year)
+        for j, column in enumerate(columns):
+            added['%s_%s' % (column, method)] = result[:, j]
+    return frame.assign(**added)
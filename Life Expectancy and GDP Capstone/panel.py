@@ -0,0 +1,97 @@
+# coding: utf-8
+"""Country/year panel with a per-country offset index.
+
+Cells In[13], In[14], In[20] and In[21] pick out one country with a boolean
+mask over the whole frame, which costs a full scan per country. `Panel`
+sorts the frame once by Country and Year and records where each country's
+rows start and stop, so a country's rows are a slice: an O(1) lookup that
+does not copy the data.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class Panel(object):
+    """A long-format frame sorted by (Country, Year) with country offsets.
+
+    `frame` keeps the original index labels, so results computed on slices
+    can be aligned back to the unsorted input.
+    """
+
+    def __init__(self, df, country='Country', year='Year'):
+        self.country_column = country
+        self.year_column = year
+        self.frame = df.sort_values([country, year], kind='mergesort')
+
+        keys = self.frame[country].to_numpy()
+        if len(keys):
+            starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        else:
+            starts = np.array([], dtype=np.intp)
+        stops = np.r_[starts[1:], len(keys)]
+        self.countries = [keys[i] for i in starts]
+        self.starts = starts
+        self.stops = stops
+        self._offsets = dict(zip(self.countries, zip(starts.tolist(), stops.tolist())))
+
+    def __len__(self):
+        return len(self.frame)
+
+    def __contains__(self, country):
+        return country in self._offsets
+
+    def __iter__(self):
+        """Yield (country, rows) pairs in sorted country order."""
+        for name in self.countries:
+            yield name, self.country(name)
+
+    def offsets(self, country):
+        """Positions (start, stop) of `country`'s rows in `frame`."""
+        try:
+            return self._offsets[country]
+        except KeyError:
+            raise KeyError('no rows for country %r' % (country,))
+
+    def country(self, country):
+        """The rows of one country, ordered by year."""
+        start, stop = self.offsets(country)
+        return self.frame.iloc[start:stop]
+
+    def values(self, column, country=None):
+        """NumPy values of `column`, for one country or the whole panel.
+
+        For numeric columns this is a view on the panel's storage.
+        """
+        values = self.frame[column].to_numpy()
+        if country is None:
+            return values
+        start, stop = self.offsets(country)
+        return values[start:stop]
+
+    def select(self, countries):
+        """Rows of several countries, in the order given."""
+        spans = [self.offsets(c) for c in countries if c in self._offsets]
+        if not spans:
+            return self.frame.iloc[:0]
+        if len(spans) == 1:
+            return self.frame.iloc[spans[0][0]:spans[0][1]]
+        positions = np.concatenate([np.arange(a, b) for a, b in spans])
+        return self.frame.iloc[positions]
+
+    def group_ids(self):
+        """Integer country id of every row, 0 .. len(countries) - 1."""
+        return np.repeat(np.arange(len(self.countries)), self.stops - self.starts)
+
+    def year_index(self):
+        """`frame` indexed by (Country, Year) for label-based lookups."""
+        return self.frame.set_index([self.country_column, self.year_column])
+
+
+def as_panel(data, country='Country', year='Year'):
+    """Return `data` if it already is a Panel, else build one from the frame."""
+    if isinstance(data, Panel):
+        return data
+    if not isinstance(data, pd.DataFrame):
+        raise TypeError('expected a DataFrame or Panel, got %s' % type(data).__name__)
+    return Panel(data, country, year)
@@ -0,0 +1,293 @@
+# coding: utf-8
+"""Per-country metrics computed across a process pool.
+
+The In[14] loop, the growth columns of In[15], the In[21] normalization and
+the per-country facets of In[23] to In[27] all treat countries
+independently. `run` splits a `panel.Panel` into chunks of whole countries
+with about the same number of rows and hands each chunk to a kernel in a
+worker process:
+
+- the numeric columns are copied once into shared memory blocks; workers
+  map them as NumPy arrays, so no row data is pickled on the way in;
+- a task is only (kernel, first country, last country);
+- results come back in chunk order, so the output is the same for any
+  number of workers, including the in-process `workers=1`.
+
+Kernels are module-level functions taking (arrays, starts, stops), where
+`arrays` maps column names to the chunk's rows and `starts`/`stops` are
+each country's row offsets within the chunk. They return a dict of arrays
+with one entry per row or one per country.
+
+    python parallel.py --rows 4000000 --workers 1 2 4 8
+"""
+
+import argparse
+import functools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from alignment import validate
+from panel import as_panel
+
+# Shared arrays attached in this worker process, by column name.
+_shared = {}
+_blocks = []
+
+
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 attaching also registers the block with the
+        # resource tracker; pool workers share the parent's tracker, so the
+        # parent's unlink still clears it.
+        return shared_memory.SharedMemory(name=name)
+
+
+def _init_worker(layout, starts, stops):
+    _shared.clear()
+    for column, (name, dtype, length) in layout.items():
+        block = _attach(name)
+        _blocks.append(block)
+        _shared[column] = np.ndarray(length, dtype=dtype, buffer=block.buf)
+    _shared[None] = (starts, stops)
+
+
+def _run_chunk(kernel, first, last):
+    starts, stops = _shared[None]
+    begin, end = starts[first], stops[last - 1]
+    arrays = dict((column, values[begin:end]) for column, values in _shared.items()
+                  if column is not None)
+    return kernel(arrays, starts[first:last] - begin, stops[first:last] - begin)
+
+
+def chunk_bounds(starts, stops, n_chunks):
+    """Split countries into at most `n_chunks` runs with similar row counts.
+
+    Returns a list of (first, last) country positions, last exclusive.
+    """
+    n = len(starts)
+    if n == 0:
+        return []
+    targets = np.linspace(0, stops[-1], max(1, min(n_chunks, n)) + 1)[1:-1]
+    cuts = np.unique(np.searchsorted(stops, targets, side='left') + 1)
+    bounds = np.r_[0, cuts[(cuts > 0) & (cuts < n)], n]
+    return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+
+def run(data, kernel, columns, workers=None, n_chunks=None):
+    """Apply `kernel` to every country of `data` and concatenate the results.
+
+    `data` is a DataFrame or `panel.Panel`; only `columns` are shared with
+    the workers. Returns a dict of arrays in the panel's (Country, Year)
+    order. `workers=None` uses every CPU; `workers=1` runs in this process.
+    """
+    panel = as_panel(data)
+    workers = workers or os.cpu_count() or 1
+    starts, stops = panel.starts, panel.stops
+    bounds = chunk_bounds(starts, stops, n_chunks or workers * 4)
+    arrays = dict((c, np.ascontiguousarray(panel.frame[c].to_numpy())) for c in columns)
+
+    if workers == 1 or len(bounds) <= 1:
+        _shared.clear()
+        _shared.update(arrays)
+        _shared[None] = (starts, stops)
+        try:
+            parts = [_run_chunk(kernel, first, last) for first, last in bounds]
+        finally:
+            _shared.clear()
+    else:
+        blocks = []
+        try:
+            layout = {}
+            for column, values in arrays.items():
+                block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+                blocks.append(block)
+                np.ndarray(len(values), dtype=values.dtype, buffer=block.buf)[:] = values
+                layout[column] = (block.name, values.dtype.str, len(values))
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(layout, starts, stops)) as pool:
+                futures = [pool.submit(_run_chunk, kernel, first, last)
+                           for first, last in bounds]
+                parts = [future.result() for future in futures]
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+    if not parts:
+        return {}
+    return dict((name, np.concatenate([part[name] for part in parts])) for name in parts[0])
+
+
+def _first_rows(starts, length):
+    first = np.zeros(length, dtype=bool)
+    first[starts] = True
+    return first
+
+
+def growth_kernel(arrays, starts, stops, value='GDP', base_year=2000):
+    """The In[15] growth columns; see `growth_metrics.add_growth_columns`."""
+    values = arrays[value].astype('float64')
+    years = arrays['Year']
+    first = _first_rows(starts, len(values))
+    prior = np.r_[np.nan, values[:-1]]
+    # Only the row one year earlier is the prior year; gaps give NaN.
+    prior[first | (np.r_[0, years[:-1]] != years - 1)] = np.nan
+    with np.errstate(invalid='ignore', divide='ignore'):
+        growth = np.where(first, 0.0, values / prior * 100.0)
+    # First base-year value of each country, broadcast to its rows.
+    lengths = stops - starts
+    country = np.repeat(np.arange(len(starts)), lengths)
+    hits = np.flatnonzero((years == base_year) & ~np.isnan(values))
+    owners, first_hit = np.unique(country[hits], return_index=True)
+    base = np.full(len(starts), np.nan)
+    base[owners] = values[hits[first_hit]]
+    base = np.repeat(base, lengths)
+    return {
+        'prior_year_' + value: np.where(first, 0.0, prior),
+        'percent_growth': growth,
+        '%s_in_%d' % (value, base_year): base,
+        'percent_growth_%ds' % base_year: values / base * 100.0,
+    }
+
+
+def summary_kernel(arrays, starts, stops, value='LEABY'):
+    """Count, mean, standard deviation, min and max per country, NaN-aware."""
+    values = arrays[value].astype('float64')
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+    if not len(starts):
+        empty = np.array([])
+        return dict((k, empty) for k in ('count', 'mean', 'std', 'min', 'max'))
+    count = np.add.reduceat(valid, starts).astype(np.int64)
+    total = np.add.reduceat(filled, starts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+        centred = np.where(valid, values - np.repeat(mean, stops - starts), 0.0)
+        std = np.sqrt(np.add.reduceat(centred * centred, starts) / (count - 1))
+    return {
+        'count': count,
+        'mean': mean,
+        'std': std,
+        'min': np.fmin.reduceat(np.where(valid, values, np.nan), starts),
+        'max': np.fmax.reduceat(np.where(valid, values, np.nan), starts),
+    }
+
+
+def normalize_kernel(arrays, starts, stops, value='LEABY', method='zscore', base_year=None):
+    """`normalize.normalize_values` of one column; 'index' also needs Year."""
+    from normalize import normalize_values
+
+    result = normalize_values(arrays[value], arrays.get('Year'), starts, stops, method,
+                              base_year)
+    return {'%s_%s' % (value, method): result}
+
+
+def correlation_kernel(arrays, starts, stops, x='GDP', y='LEABY'):
+    """Pearson correlation of `x` and `y` per country over complete pairs."""
+    gx = arrays[x].astype('float64')
+    gy = arrays[y].astype('float64')
+    valid = ~(np.isnan(gx) | np.isnan(gy))
+    if not len(starts):
+        return {'n': np.array([], dtype=np.int64), 'pearson': np.array([])}
+    n = np.add.reduceat(valid, starts).astype(np.int64)
+    lengths = stops - starts
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mx = np.add.reduceat(np.where(valid, gx, 0.0), starts) / n
+        my = np.add.reduceat(np.where(valid, gy, 0.0), starts) / n
+        dx = np.where(valid, gx - np.repeat(mx, lengths), 0.0)
+        dy = np.where(valid, gy - np.repeat(my, lengths), 0.0)
+        r = (np.add.reduceat(dx * dy, starts)
+             / np.sqrt(np.add.reduceat(dx * dx, starts) * np.add.reduceat(dy * dy, starts)))
+    return {'n': n, 'pearson': r}
+
+
+def growth_columns(data, value='GDP', base_year=None, workers=None):
+    """`add_growth_columns` computed in parallel; rows in (Country, Year) order.
+
+    Like the serial version, raises ValueError for repeated (Country, Year) pairs.
+    """
+    panel = as_panel(data)
+    validate(panel)
+    if base_year is None:
+        base_year = int(panel.frame['Year'].min())
+    kernel = functools.partial(growth_kernel, value=value, base_year=base_year)
+    columns = run(panel, kernel, [value, 'Year'], workers)
+    return panel.frame.assign(**columns)
+
+
+def country_table(data, kernel, columns, workers=None):
+    """Per-country kernel results as a frame indexed by country."""
+    panel = as_panel(data)
+    result = run(panel, kernel, columns, workers)
+    return pd.DataFrame(result, index=pd.Index(panel.countries, name='Country'))
+
+
+def summaries(data, value='LEABY', workers=None):
+    """`summary_kernel` per country (the In[14] loop generalized)."""
+    return country_table(data, functools.partial(summary_kernel, value=value), [value], workers)
+
+
+def correlations(data, x='GDP', y='LEABY', workers=None):
+    """`correlation_kernel` per country."""
+    return country_table(data, functools.partial(correlation_kernel, x=x, y=y), [x, y], workers)
+
+
+def normalized(data, value='LEABY', method='zscore', base_year=None, workers=None):
+    """`normalize_kernel` as a Series aligned to the panel's rows."""
+    panel = as_panel(data)
+    kernel = functools.partial(normalize_kernel, value=value, method=method, base_year=base_year)
+    result = run(panel, kernel, [value, 'Year'], workers)
+    return pd.Series(result['%s_%s' % (value, method)], index=panel.frame.index)
+
+
+def benchmark(rows=4 * 10 ** 6, workers=None, n_years=60, repeat=3):
+    """Time each metric at 1 to N workers and check the outputs agree."""
+    import time
+    from panel import Panel
+    from synthetic import synthetic_rows
+
+    workers = workers or sorted(set([1, 2, 4, os.cpu_count() or 1]))
+    panel = Panel(synthetic_rows(rows, n_years))
+    metrics = (
+        ('growth', lambda w: growth_columns(panel, workers=w)),
+        ('summaries', lambda w: summaries(panel, workers=w)),
+        ('correlations', lambda w: correlations(panel, workers=w)),
+        ('zscores', lambda w: normalized(panel, workers=w)),
+    )
+    print('%d rows, %d countries, %d CPUs' % (len(panel), len(panel.countries),
+                                              os.cpu_count() or 1))
+    print('%-14s %8s %10s %8s' % ('metric', 'workers', 'seconds', 'speedup'))
+    for name, fn in metrics:
+        reference = None
+        serial = None
+        for w in workers:
+            best = None
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                result = fn(w)
+                elapsed = time.perf_counter() - t0
+                best = elapsed if best is None else min(best, elapsed)
+            if reference is None:
+                reference, serial = result, best
+            else:
+                pd.testing.assert_frame_equal(pd.DataFrame(result), pd.DataFrame(reference))
+            print('%-14s %8d %10.3f %8.2f' % (name, w, best, serial / best))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=4 * 10 ** 6)
+    parser.add_argument('--workers', type=int, nargs='+')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+    benchmark(args.rows, args.workers, repeat=args.repeat)
+
+
+if __name__ == '__main__':
+    main()
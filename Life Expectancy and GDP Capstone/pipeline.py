@@ -0,0 +1,102 @@
+# coding: utf-8
+"""The notebook pipeline as named stages, with optional tracing.
+
+Runs what life_expectancy_gdp.py does without the interactive display:
+loading (In[3]/In[7]), building the panel, the per-country first-year
+summary (In[14]), the growth columns (In[15]), the LEABY index of In[21],
+rendering every chart (In[9] to In[27]) and, with `--report`, exporting the
+Step 12 report bundle from those figures (see report.py). Stages are timed
+only when a tracer is passed in:
+
+    python pipeline.py --report report --trace trace.json --profile profiles
+
+writes one JSON record per stage (wall and CPU seconds, memory delta and
+row count, plus statistics/draw/encode records per chart) and a cProfile
+dump of each top-level stage.
+"""
+
+import argparse
+
+from instrument import NULL_TRACER, Tracer
+
+
+def run(data='all_data.csv', out_dir='figures', formats=('png',), countries=None,
+        workers=None, force=False, tracer=NULL_TRACER, limits=None, report_dir=None,
+        cache_dir=None):
+    """Run every stage; return the render status dict of `render.render_all`.
+
+    `limits` is passed on to `render_all` to reduce the facet charts. With
+    `report_dir`, the report bundle is exported there from the PNG figures.
+    With `cache_dir`, bar-chart statistics are kept there across runs.
+    """
+    if report_dir is not None and 'png' not in formats:
+        raise ValueError('the report is built from PNG figures; add png to formats')
+    from aggregation import AggregationCache
+    from data_loader import load_data
+    from growth_metrics import add_growth_columns
+    from normalize import normalize
+    from panel import Panel
+    from render import render_all
+
+    with tracer.stage('load') as record:
+        df = load_data(data)
+        record['rows'] = len(df)
+    with tracer.stage('panel', rows=len(df)):
+        panel = Panel(df)
+    with tracer.stage('country_summary', rows=len(df)) as record:
+        first_gdp = {country: rows['GDP'].iloc[0] for country, rows in panel}
+        record['countries'] = len(first_gdp)
+    with tracer.stage('growth', rows=len(df)):
+        panel = Panel(add_growth_columns(panel, base_year=2000))
+    with tracer.stage('normalize', rows=len(df)):
+        panel = Panel(normalize(panel, 'LEABY', 'index', base_year=2000))
+    cache = AggregationCache(directory=cache_dir) if cache_dir else None
+    with tracer.stage('render', rows=len(df)) as record:
+        status = render_all(panel, out_dir=out_dir, formats=formats, countries=countries,
+                            workers=workers, force=force, cache=cache, tracer=tracer,
+                            limits=limits)
+        record['rendered'] = sum(1 for state in status.values() if state == 'rendered')
+    if report_dir is not None:
+        from report import export
+
+        with tracer.stage('export', rows=len(df)) as record:
+            if countries is not None:
+                panel = Panel(panel.select(list(countries)))
+            exported = export(panel, status, out_dir, report_dir, tracer=tracer)
+            record['encoded'] = sum(1 for state in exported.values() if state == 'encoded')
+    return status
+
+
+def main(argv=None):
+    from render import add_limit_arguments, limits_from_args
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--data', default='all_data.csv')
+    parser.add_argument('--out', default='figures')
+    parser.add_argument('--format', nargs='+', default=['png'], choices=['png', 'svg'])
+    parser.add_argument('--countries', nargs='+')
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--force', action='store_true')
+    parser.add_argument('--trace', metavar='JSON', help='write stage timings to this file')
+    parser.add_argument('--profile', metavar='DIR',
+                        help='dump a cProfile of each stage into this directory')
+    parser.add_argument('--cache-dir', help='keep bar-chart statistics in this directory')
+    parser.add_argument('--report', metavar='DIR',
+                        help='also export the HTML/PDF report bundle here')
+    add_limit_arguments(parser)
+    args = parser.parse_args(argv)
+
+    tracer = NULL_TRACER
+    if args.trace or args.profile:
+        tracer = Tracer(profile_dir=args.profile)
+    run(args.data, args.out, args.format, args.countries, args.workers, args.force, tracer,
+        limits_from_args(args), args.report, args.cache_dir)
+    if args.trace:
+        tracer.write(args.trace)
+        for record in tracer.to_dict()['stages']:
+            if record['parent'] is None:
+                print('%-16s %10.3f s' % (record['name'], record['wall_s']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,342 @@
+# coding: utf-8
+"""Interactive queries over the panel from tables built once at load time.
+
+Questions like "average LEABY of these nations" or "Zimbabwe's GDP in
+2008" used to mean rerunning notebook cells. `QueryEngine` answers them
+from structures it precomputes:
+
+- a countries x years grid per value for point and range lookups;
+- a per-country table (mean, min, max, first and last value and year,
+  growth from first to last year, CAGR) with the sums and counts behind
+  the means, and each statistic's countries sorted once for top-N queries;
+- a per-year table of the mean, min, max and count across countries.
+
+`serve` exposes the same queries as JSON over a local HTTP server:
+
+    python query.py serve --port 8000
+    curl 'localhost:8000/value?country=Zimbabwe&year=2008&column=GDP'
+    curl 'localhost:8000/mean?column=LEABY&countries=Chile,Mexico'
+    curl 'localhost:8000/top?column=GDP&stat=growth&n=3'
+
+    python query.py bench
+"""
+
+import argparse
+import json
+
+import numpy as np
+import pandas as pd
+
+from correlation import year_grid
+from panel import as_panel
+
+VALUES = ('GDP', 'LEABY')
+COUNTRY_STATS = ('mean', 'min', 'max', 'first', 'last', 'first_year', 'last_year',
+                 'growth', 'cagr', 'count')
+YEAR_STATS = ('mean', 'min', 'max', 'count')
+
+
+def _nan_to_none(value):
+    if isinstance(value, (float, np.floating)) and np.isnan(value):
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _decimal(grid):
+    # float32 values widened through their shortest repr, so LEABY 77.3 from
+    # the loader stays 77.3 rather than 77.30000305175781 in every statistic.
+    # Only the distinct values go through strings; a panel repeats them a lot.
+    unique, inverse = np.unique(grid.astype(np.float32), return_inverse=True)
+    return unique.astype(str).astype(np.float64)[inverse].reshape(grid.shape)
+
+
+def _records(table):
+    # One dict of plain Python values per row, ready to return as JSON.
+    return [dict((k, _nan_to_none(v)) for k, v in zip(table.columns, row))
+            for row in table.itertuples(index=False)]
+
+
+class QueryEngine(object):
+    """Point, range, aggregate and top-N queries over a country/year panel."""
+
+    def __init__(self, data, values=VALUES):
+        self.values = list(values)
+        self.grids = {}
+        self.country_tables = {}
+        self.year_tables = {}
+        self._sums = {}
+        self._counts = {}
+        self._country_rows = {}
+        self._year_rows = {}
+        self._orders = {}
+        panel = as_panel(data)
+        for value in self.values:
+            countries, years, grid = year_grid(panel, value)
+            if panel.frame[value].dtype == np.float32:
+                grid = _decimal(grid)
+            self.grids[value] = grid
+            self.country_tables[value] = self._country_table(countries, years, grid)
+            self.year_tables[value] = self._year_table(years, grid)
+            self._sums[value] = np.nansum(grid, axis=1)
+            self._counts[value] = self.country_tables[value]['count'].to_numpy()
+            self._country_rows[value] = _records(self.country_tables[value])
+            self._year_rows[value] = _records(self.year_tables[value])
+        self.countries = list(countries)
+        self.years = years
+        self._code = dict((c, i) for i, c in enumerate(self.countries))
+
+    @staticmethod
+    def _country_table(countries, years, grid):
+        present = ~np.isnan(grid)
+        count = present.sum(axis=1)
+        has = count > 0
+        first_pos = np.where(has, present.argmax(axis=1), 0)
+        last_pos = np.where(has, grid.shape[1] - 1 - present[:, ::-1].argmax(axis=1), 0)
+        rows = np.arange(len(grid))
+        first = np.where(has, grid[rows, first_pos], np.nan)
+        last = np.where(has, grid[rows, last_pos], np.nan)
+        span = (last_pos - first_pos).astype('float64')
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.nansum(grid, axis=1) / count
+            cagr = (np.power(last / first, 1.0 / np.where(span > 0, span, np.nan)) - 1.0) * 100.0
+            growth = (last / first - 1.0) * 100.0
+            low = np.where(has, np.nanmin(np.where(present, grid, np.inf), axis=1), np.nan)
+            high = np.where(has, np.nanmax(np.where(present, grid, -np.inf), axis=1), np.nan)
+        return pd.DataFrame({
+            'mean': mean, 'min': low, 'max': high, 'first': first, 'last': last,
+            'first_year': np.where(has, years[first_pos], -1),
+            'last_year': np.where(has, years[last_pos], -1),
+            'growth': growth, 'cagr': cagr, 'count': count,
+        }, index=pd.Index(countries, name='Country'), columns=list(COUNTRY_STATS))
+
+    @staticmethod
+    def _year_table(years, grid):
+        present = ~np.isnan(grid)
+        count = present.sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.nansum(grid, axis=0) / count
+        low = np.min(np.where(present, grid, np.inf), axis=0)
+        high = np.max(np.where(present, grid, -np.inf), axis=0)
+        return pd.DataFrame({
+            'mean': mean,
+            'min': np.where(count > 0, low, np.nan),
+            'max': np.where(count > 0, high, np.nan),
+            'count': count,
+        }, index=pd.Index(years, name='Year'), columns=list(YEAR_STATS))
+
+    def _column(self, column):
+        if column not in self.grids:
+            raise KeyError('unknown column %r; expected one of %s'
+                           % (column, ', '.join(self.values)))
+        return column
+
+    def _country_code(self, country):
+        try:
+            return self._code[country]
+        except KeyError:
+            raise KeyError('unknown country %r' % (country,))
+
+    def _year_pos(self, year):
+        pos = int(year) - int(self.years[0]) if len(self.years) else -1
+        if not 0 <= pos < len(self.years):
+            raise KeyError('year %r is outside %d-%d' % (year, self.years[0], self.years[-1]))
+        return pos
+
+    def _order(self, column, stat):
+        # Country codes sorted by `stat`, descending, NaN last; built lazily once.
+        key = (column, stat)
+        if key not in self._orders:
+            values = self.country_tables[column][stat].to_numpy(dtype='float64')
+            self._orders[key] = np.argsort(np.where(np.isnan(values), np.inf, -values),
+                                           kind='stable')
+        return self._orders[key]
+
+    def value(self, country, year, column='GDP'):
+        """The value of `column` for one country and year (None if missing)."""
+        grid = self.grids[self._column(column)]
+        return _nan_to_none(grid[self._country_code(country), self._year_pos(year)])
+
+    def series(self, country, column='GDP', start=None, end=None):
+        """[(year, value), ...] for `country` between `start` and `end` inclusive."""
+        grid = self.grids[self._column(column)]
+        lo = 0 if start is None else self._year_pos(max(int(start), int(self.years[0])))
+        hi = len(self.years) - 1 if end is None else self._year_pos(min(int(end),
+                                                                        int(self.years[-1])))
+        row = grid[self._country_code(country), lo:hi + 1]
+        return [(int(y), _nan_to_none(v)) for y, v in zip(self.years[lo:hi + 1], row)
+                if not np.isnan(v)]
+
+    def country_summary(self, country, column='GDP'):
+        """Every COUNTRY_STATS entry for one country."""
+        return dict(self._country_rows[self._column(column)][self._country_code(country)])
+
+    def year_summary(self, year, column='GDP'):
+        """Every YEAR_STATS entry across countries for one year."""
+        return dict(self._year_rows[self._column(column)][self._year_pos(year)])
+
+    def mean(self, column='LEABY', countries=None, start=None, end=None):
+        """Mean of `column` over all rows of `countries` (all if None).
+
+        Without a year range this uses the precomputed per-country sums and
+        counts; with one, the grid slice.
+        """
+        column = self._column(column)
+        codes = (slice(None) if countries is None
+                 else [self._country_code(c) for c in countries])
+        if start is None and end is None:
+            total = self._sums[column][codes].sum()
+            count = self._counts[column][codes].sum()
+            return _nan_to_none(total / count if count else np.nan)
+        lo = 0 if start is None else self._year_pos(start)
+        hi = len(self.years) - 1 if end is None else self._year_pos(end)
+        block = self.grids[column][codes, lo:hi + 1]
+        count = (~np.isnan(block)).sum()
+        return _nan_to_none(np.nansum(block) / count if count else np.nan)
+
+    def top(self, column='GDP', n=5, stat='mean', year=None, ascending=False):
+        """[(country, value), ...] for the `n` countries with the highest `stat`.
+
+        `stat` is one of COUNTRY_STATS, or the value itself in `year` when
+        `year` is given. NaN values are never included.
+        """
+        column = self._column(column)
+        n = int(n)
+        if year is not None:
+            values = self.grids[column][:, self._year_pos(year)]
+            order = np.argsort(np.where(np.isnan(values), np.inf,
+                                        values if ascending else -values), kind='stable')
+        else:
+            if stat not in COUNTRY_STATS:
+                raise KeyError('unknown statistic %r' % (stat,))
+            values = self.country_tables[column][stat].to_numpy(dtype='float64')
+            order = self._order(column, stat)
+            if ascending:
+                valid = order[~np.isnan(values[order])]
+                order = valid[::-1]
+        picked = [i for i in order[:n] if not np.isnan(values[i])]
+        return [(self.countries[i], _nan_to_none(values[i])) for i in picked]
+
+    def answer(self, op, params):
+        """Run query `op` ('value', 'series', 'summary', 'year', 'mean' or
+        'top') with string parameters, as the HTTP service receives them."""
+        params = dict(params)
+        column = params.get('column', 'GDP')
+        if op == 'value':
+            return self.value(params['country'], int(params['year']), column)
+        if op == 'series':
+            return self.series(params['country'], column, params.get('start'), params.get('end'))
+        if op == 'summary':
+            return self.country_summary(params['country'], column)
+        if op == 'year':
+            return self.year_summary(int(params['year']), column)
+        if op == 'mean':
+            countries = params.get('countries')
+            return self.mean(column, countries.split(',') if countries else None,
+                             params.get('start') and int(params['start']),
+                             params.get('end') and int(params['end']))
+        if op == 'top':
+            return self.top(column, int(params.get('n', 5)), params.get('stat', 'mean'),
+                            params.get('year') and int(params['year']),
+                            params.get('ascending', 'false').lower() in ('1', 'true', 'yes'))
+        raise KeyError('unknown query %r' % (op,))
+
+
+def make_server(engine, host='127.0.0.1', port=8000):
+    """A threading HTTP server answering GET /<op>?<params> with JSON."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qsl, urlsplit
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlsplit(self.path)
+            try:
+                body = {'result': engine.answer(url.path.strip('/'), parse_qsl(url.query))}
+                code = 200
+            except (KeyError, ValueError, TypeError) as e:
+                body = {'error': str(e.args[0]) if e.args else type(e).__name__}
+                code = 404 if isinstance(e, KeyError) else 400
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def serve(engine, host='127.0.0.1', port=8000):
+    """Answer queries over HTTP until interrupted."""
+    server = make_server(engine, host, port)
+    print('serving %d countries on http://%s:%d/' % (len(engine.countries), host,
+                                                     server.server_address[1]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def benchmark(n_countries=200, n_years=60, repeat=2000):
+    """Median and 99th percentile latency of each query, with a pandas baseline."""
+    import time
+    from synthetic import synthetic_panel
+
+    df = synthetic_panel(n_countries, n_years)
+    t0 = time.perf_counter()
+    engine = QueryEngine(df)
+    print('%d rows: tables built in %.3f s' % (len(df), time.perf_counter() - t0))
+    country = engine.countries[n_countries // 2]
+    some = engine.countries[:6]
+    year = int(engine.years[len(engine.years) // 2])
+    queries = [
+        ('value', lambda: engine.value(country, year, 'GDP')),
+        ('series', lambda: engine.series(country, 'GDP', year - 5, year + 5)),
+        ('summary', lambda: engine.country_summary(country, 'GDP')),
+        ('year', lambda: engine.year_summary(year, 'LEABY')),
+        ('mean', lambda: engine.mean('LEABY', some)),
+        ('mean_range', lambda: engine.mean('LEABY', some, year - 5, year + 5)),
+        ('top', lambda: engine.top('GDP', 5, 'growth')),
+        ('top_year', lambda: engine.top('GDP', 5, year=year)),
+        ('pandas_value', lambda: df.loc[(df['Country'] == country) & (df['Year'] == year),
+                                        'GDP'].iloc[0]),
+        ('pandas_mean', lambda: df.loc[df['Country'].isin(some), 'LEABY'].mean()),
+    ]
+    print('%-14s %12s %12s' % ('query', 'median us', 'p99 us'))
+    for name, query in queries:
+        times = np.empty(repeat)
+        for i in range(repeat):
+            t0 = time.perf_counter()
+            query()
+            times[i] = time.perf_counter() - t0
+        median, p99 = np.percentile(times, [50, 99]) * 1e6
+        print('%-14s %12.1f %12.1f' % (name, median, p99))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    p = commands.add_parser('serve', help=serve.__doc__)
+    p.add_argument('--data', default='all_data.csv')
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('--port', type=int, default=8000)
+    p = commands.add_parser('bench', help=benchmark.__doc__)
+    p.add_argument('--countries', type=int, default=200)
+    p.add_argument('--years', type=int, default=60)
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        from data_loader import load_data
+        serve(QueryEngine(load_data(args.data)), args.host, args.port)
+    else:
+        benchmark(args.countries, args.years)
+
+
+if __name__ == '__main__':
+    main()
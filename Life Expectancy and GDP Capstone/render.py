@@ -0,0 +1,439 @@
+# coding: utf-8
+"""Headless batch rendering of the notebook charts.
+
+Each figure from cells In[9] to In[27] is declared once as a `ChartSpec`.
+`render_all` draws them with the Agg backend across a process pool and writes
+PNG and/or SVG files whose bytes depend only on the spec and the data. A
+manifest in the output directory records a hash of both for every chart, so
+charts whose inputs have not changed since the last run are skipped.
+
+    python render.py --out figures --format png svg --workers 4
+"""
+
+import argparse
+import collections
+import contextlib
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from aggregation import summarize
+from downsample import FacetLimits, paginate, reduce_facet
+from instrument import NULL_TRACER
+from panel import as_panel
+
+MANIFEST = '.render-manifest.json'
+SVG_HASHSALT = 'life-expectancy-gdp'
+
+ChartSpec = collections.namedtuple('ChartSpec', [
+    'name', 'kind', 'x', 'y', 'hue', 'col', 'countries', 'title', 'xlabel',
+    'ylabel', 'figsize', 'rotation', 'legend_outside', 'col_wrap', 'height',
+    'palette', 'plot', 'kws',
+])
+ChartSpec.__new__.__defaults__ = (
+    None, None, None, None, None, None, (10, 5), 90, False, 3, 4, None, 'plot', (),
+)
+ChartSpec.__doc__ = """Declarative description of one chart.
+
+`kind` is 'bar', 'violin' or 'facet'. Facet charts map `plot` ('plot' or
+'scatter') over a FacetGrid split by `col`. `countries` restricts the chart
+to those countries; `kws` holds extra (name, value) pairs for the plotting
+call.
+"""
+
+ZIMBABWE = ('Zimbabwe',)
+
+CHARTS = (
+    ChartSpec('gdp_bar', 'bar', 'Country', 'GDP', palette='Set2',
+              title='GDPs by Country', xlabel='Country',
+              ylabel='GDP in Trillions of U.S. Dollars'),                       # In[9]
+    ChartSpec('leaby_bar', 'bar', 'Country', 'LEABY', palette='Set2',
+              title='Life Expectancy at Birth by Country', xlabel='Country',
+              ylabel='Life expectancy at birth (years)'),                       # In[10]
+    ChartSpec('leaby_violin', 'violin', 'Country', 'LEABY', palette='Set2',
+              title='Life Expectancy at Birth by Country', xlabel='Country',
+              ylabel='Life expectancy at birth (years)', figsize=(15, 10)),     # In[11]
+    ChartSpec('trend_gdp_bar', 'bar', 'Country', 'GDP', hue='Year',
+              title='Year Trend of GDP in 10s of Trillions of U.S. Dollars by Country',
+              ylabel='GDP in 10s of Trillions of U.S. Dollars', figsize=(10, 15)),  # In[12]
+    ChartSpec('trend_zbw_bar', 'bar', 'Country', 'GDP', hue='Year', countries=ZIMBABWE,
+              title='Year Trend of GDP in 10s of Trillions of U.S. Dollars in Zimbabwe',
+              ylabel='GDP in 10s of Trillions of U.S. Dollars', figsize=(10, 8),
+              rotation=0, legend_outside=True),                                 # In[13]
+    ChartSpec('trend_perc_growth_bar', 'bar', 'Country', 'percent_growth', hue='Year',
+              title='% GDP Growth from Previous Year',
+              ylabel='% GDP growth from previous year', figsize=(10, 15)),      # In[17]
+    ChartSpec('trend_base_growth_bar', 'bar', 'Country', 'percent_growth_2000s', hue='Year',
+              ylabel='% GDP growth from GDP in 2000', figsize=(10, 15)),        # In[18]
+    ChartSpec('trend_leaby_bar', 'bar', 'Country', 'LEABY', hue='Year',
+              ylabel='Life expectancy at birth in years', figsize=(10, 15),
+              legend_outside=True),                                             # In[19]
+    ChartSpec('trendLEABY_zbw_bar', 'bar', 'Country', 'LEABY', hue='Year', countries=ZIMBABWE,
+              title='Life Expectancy at Birth Trend',
+              ylabel='Life expectancy at birth in years', figsize=(10, 8),
+              rotation=0, legend_outside=True),                                 # In[20]
+    ChartSpec('leaby_change_bar', 'bar', 'Country', 'LEABY_index', hue='Year',
+              title='Life Expectancy at Birth as % of 2000',
+              ylabel='% of life expectancy at birth in 2000', figsize=(10, 15),
+              legend_outside=True),                                             # In[21]
+    ChartSpec('leaby_facet', 'facet', 'GDP', 'LEABY', hue='Country', col='Year',
+              title='Life Expectancy at Birth (LEABY) Changes in Countries by Year',
+              col_wrap=4, height=2, palette='Set2', plot='scatter',
+              kws=(('edgecolor', 'w'),)),                                       # In[22]
+    ChartSpec('growth_country_facet', 'facet', 'Year', 'percent_growth', col='Country',
+              title='Percent of Yearly GDP growth to Year by Country'),         # In[23]
+    ChartSpec('base_growth_country_facet', 'facet', 'Year', 'percent_growth_2000s',
+              col='Country',
+              title='Percent of Yearly GDP growth to Year by Country'),         # In[24]
+    ChartSpec('growth_leaby_country_facet', 'facet', 'percent_growth_2000s', 'LEABY',
+              col='Country', plot='scatter', kws=(('edgecolor', 'w'),),
+              title='Percent GDP growth from GDP in 2000 to LEABY by Country'),  # In[25]
+    ChartSpec('leaby_country_facet', 'facet', 'Year', 'LEABY', col='Country',
+              title='LEABY Yearly by Country'),                                 # In[26]
+    ChartSpec('gdp_facet', 'facet', 'Year', 'GDP', col='Country',
+              title='GDP (10s of Trillion USD) Yearly by Country'),             # In[27]
+)
+
+
+def chart_data(panel, spec, countries=None, cache=None):
+    """Rows and columns of `panel` that `spec` draws, limited to `countries`.
+
+    Bar charts get their `aggregation.summarize` table instead of raw rows,
+    so the means and CIs come from the aggregation cache.
+    """
+    panel = as_panel(panel)
+    columns = [c for c in ('Country', spec.x, spec.y, spec.hue, spec.col) if c is not None]
+    columns = list(dict.fromkeys(columns))
+    subset = None
+    for names in (spec.countries, countries):
+        if names is not None:
+            subset = list(names) if subset is None else [c for c in subset if c in names]
+    rows = panel.frame if subset is None else panel.select(subset)
+    data = rows[columns]
+    if isinstance(data['Country'].dtype, pd.CategoricalDtype):
+        data = data.assign(Country=data['Country'].cat.remove_unused_categories())
+    if spec.kind == 'bar' and not data.empty:
+        by = [spec.x] + ([spec.hue] if spec.hue else [])
+        data = summarize(data, spec.y, by, cache=cache)
+    return data
+
+
+def chart_key(spec, data, formats):
+    """Hash of everything that determines the chart's output files."""
+    digest = hashlib.sha256(repr((tuple(spec), tuple(formats))).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes())
+    digest.update(repr(list(data.columns)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _init_worker():
+    # Pool workers only: sets the backend and rcParams for the whole process.
+    import matplotlib
+    matplotlib.use('Agg')
+    matplotlib.rcParams['svg.hashsalt'] = SVG_HASHSALT
+
+
+@contextlib.contextmanager
+def _local_settings():
+    # In the caller's process the backend, interactive mode and rcParams are
+    # left as they were, so notebooks can keep plotting afterwards.
+    import matplotlib
+    from matplotlib import pyplot as plt
+
+    with matplotlib.rc_context({'svg.hashsalt': SVG_HASHSALT}), plt.ioff():
+        yield
+
+
+def _draw(spec, data):
+    from matplotlib import pyplot as plt
+    import seaborn as sns
+
+    kws = dict(spec.kws)
+    if spec.kind == 'facet':
+        g = sns.FacetGrid(data, col=spec.col, hue=spec.hue, col_wrap=spec.col_wrap,
+                          height=spec.height, palette=spec.palette)
+        g.map(getattr(plt, spec.plot), spec.x, spec.y, **kws)
+        if spec.hue is not None:
+            # Without a hue the legend is empty but still costs two layouts.
+            g.add_legend()
+        g.fig.subplots_adjust(top=0.9)
+        if spec.title:
+            g.fig.suptitle(spec.title)
+        return g.fig
+
+    fig, ax = plt.subplots(figsize=spec.figsize)
+    if spec.kind == 'violin':
+        sns.violinplot(data=data, x=spec.x, y=spec.y, hue=spec.x, palette=spec.palette,
+                       legend=False, ax=ax, **kws)
+    elif spec.kind == 'bar':
+        _draw_summary_bars(ax, spec, data, **kws)
+    else:
+        raise ValueError('unknown chart kind %r' % spec.kind)
+    if spec.xlabel:
+        ax.set_xlabel(spec.xlabel)
+    if spec.ylabel:
+        ax.set_ylabel(spec.ylabel)
+    if spec.title:
+        ax.set_title(spec.title)
+    ax.tick_params(axis='x', labelrotation=spec.rotation)
+    if spec.legend_outside and ax.get_legend() is not None:
+        ax.legend(loc='center left', bbox_to_anchor=(1, 0.5))
+    return fig
+
+
+def _draw_summary_bars(ax, spec, summary, **kws):
+    # Grouped bars with CI whiskers from an aggregation summary table, laid
+    # out like sns.barplot: one slot per x level, split between hue levels.
+    import seaborn as sns
+
+    levels = list(dict.fromkeys(summary[spec.x]))
+    positions = np.arange(len(levels))
+    if spec.hue is None:
+        groups = [(None, summary)]
+        n_colors = len(levels)
+    else:
+        hues = sorted(summary[spec.hue].unique())
+        groups = [(h, summary[summary[spec.hue] == h]) for h in hues]
+        n_colors = len(hues)
+    # Same fallback as seaborn: husl when the default cycle is too short.
+    palette = spec.palette
+    if palette is None and n_colors > len(sns.color_palette()):
+        palette = 'husl'
+    colors = sns.color_palette(palette, n_colors)
+    width = 0.8 / len(groups)
+
+    for i, (hue, rows) in enumerate(groups):
+        rows = rows.set_index(spec.x).reindex(levels)
+        mean = rows['mean'].to_numpy()
+        yerr = np.vstack([mean - rows['ci_low'].to_numpy(), rows['ci_high'].to_numpy() - mean])
+        offset = (i - (len(groups) - 1) / 2.0) * width
+        ax.bar(positions + offset, mean, width, yerr=np.nan_to_num(yerr),
+               color=colors if hue is None else colors[i],
+               label=None if hue is None else str(hue),
+               error_kw={'ecolor': '.26', 'elinewidth': 1.5}, **kws)
+
+    ax.set_xticks(positions)
+    ax.set_xticklabels([str(level) for level in levels])
+    ax.set_xlim(-0.5, len(levels) - 0.5)
+    ax.set_xlabel(spec.x)
+    ax.set_ylabel(spec.y)
+    if spec.hue is not None:
+        ax.legend(title=spec.hue)
+
+
+def _metadata(fmt):
+    if fmt == 'svg':
+        return {'Date': None, 'Creator': None}
+    if fmt == 'png':
+        return {'Software': None}
+    return None
+
+
+def render_chart(spec, data, out_dir, formats=('png',), timings=None):
+    """Draw `spec` from `data` and save it once per format; return the paths.
+
+    If `timings` is a dict, the seconds spent drawing and encoding are
+    stored in it under 'draw_s' and 'encode_s'.
+    """
+    from matplotlib import pyplot as plt
+
+    t0 = time.perf_counter()
+    fig = _draw(spec, data)
+    t1 = time.perf_counter()
+    paths = []
+    try:
+        for fmt in formats:
+            path = os.path.join(out_dir, '%s.%s' % (spec.name, fmt))
+            fig.savefig(path, format=fmt, metadata=_metadata(fmt), bbox_inches='tight')
+            paths.append(path)
+    finally:
+        plt.close(fig)
+    if timings is not None:
+        timings['draw_s'] = t1 - t0
+        timings['encode_s'] = time.perf_counter() - t1
+    return paths
+
+
+def _timed_render(spec, data, out_dir, formats):
+    # Worker entry point: render and send the timings back.
+    timings = {'pid': os.getpid()}
+    render_chart(spec, data, out_dir, formats, timings)
+    return timings
+
+
+def _record_render(tracer, spec, data, timings):
+    rows = len(data)
+    tracer.record('draw:' + spec.name, rows=rows, wall_s=timings['draw_s'], pid=timings['pid'])
+    tracer.record('encode:' + spec.name, rows=rows, wall_s=timings['encode_s'],
+                  pid=timings['pid'])
+
+
+def load_manifest(out_dir):
+    """Chart name -> input hash of every chart last rendered into `out_dir`."""
+    try:
+        with open(os.path.join(out_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, MANIFEST)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def render_all(df, specs=CHARTS, out_dir='figures', formats=('png',), countries=None,
+               workers=None, force=False, cache=None, tracer=NULL_TRACER, limits=None):
+    """Render every spec in `specs` from `df`, skipping unchanged charts.
+
+    `df` may be a DataFrame or a `panel.Panel`. Returns a dict mapping chart
+    names to 'rendered', 'unchanged' or 'empty' (no rows left after the
+    country filter). With `workers=1` everything runs in this process.
+    Bar-chart statistics go through `cache`, an `aggregation.AggregationCache`
+    (the module default if None). With an `instrument.Tracer`, the
+    statistics, drawing and encoding of each chart are recorded as separate
+    stages. With `limits`, a `downsample.FacetLimits`, facet charts are
+    reduced before drawing and split into pages named `<chart>_p01`, ...,
+    each with its own status. If a chart fails, the first error is raised
+    after the manifest has recorded every chart that was written.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    panel = as_panel(df)
+    manifest = load_manifest(out_dir)
+    status = {}
+    jobs = []
+    for spec in specs:
+        with tracer.stage('statistics:' + spec.name) as record:
+            data = chart_data(panel, spec, countries, cache)
+            record['rows'] = len(data)
+        if data.empty:
+            status[spec.name] = 'empty'
+            continue
+        pages = [(spec, data)]
+        if limits is not None and spec.kind == 'facet':
+            with tracer.stage('downsample:' + spec.name) as record:
+                data = reduce_facet(data, spec, limits)
+                pages = paginate(data, spec, limits.max_facets)
+                record['rows'] = len(data)
+                record['pages'] = len(pages)
+        for spec, data in pages:
+            key = chart_key(spec, data, formats)
+            outputs = [os.path.join(out_dir, '%s.%s' % (spec.name, fmt)) for fmt in formats]
+            if (not force and manifest.get(spec.name) == key
+                    and all(map(os.path.exists, outputs))):
+                status[spec.name] = 'unchanged'
+                continue
+            jobs.append((spec, data, key))
+
+    # The manifest is saved even if a chart fails, so the charts that were
+    # written are not redrawn on the next run.
+    try:
+        if workers == 1 or len(jobs) <= 1:
+            with _local_settings():
+                for spec, data, key in jobs:
+                    timings = _timed_render(spec, data, out_dir, formats)
+                    _record_render(tracer, spec, data, timings)
+                    manifest[spec.name] = key
+                    status[spec.name] = 'rendered'
+        else:
+            error = None
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                futures = [(spec, data, key,
+                            pool.submit(_timed_render, spec, data, out_dir, formats))
+                           for spec, data, key in jobs]
+                for spec, data, key, future in futures:
+                    try:
+                        timings = future.result()
+                    except Exception as exc:
+                        # Keep collecting the charts that did finish.
+                        error = error or exc
+                        continue
+                    _record_render(tracer, spec, data, timings)
+                    manifest[spec.name] = key
+                    status[spec.name] = 'rendered'
+            if error is not None:
+                raise error
+    finally:
+        _save_manifest(out_dir, manifest)
+    return status
+
+
+def chart_frame(path='all_data.csv'):
+    """The loaded panel with the In[15] and In[21] columns, as the charts expect."""
+    from data_loader import load_data
+    from growth_metrics import add_growth_columns
+    from normalize import normalize
+
+    frame = add_growth_columns(load_data(path), base_year=2000)
+    return normalize(frame, 'LEABY', 'index', base_year=2000)
+
+
+def limits_from_args(args):
+    """`FacetLimits` from --fast/--max-facets/--max-points/--top-n, or None."""
+    given = dict((name, getattr(args, name)) for name in FacetLimits._fields
+                 if getattr(args, name) is not None)
+    if not args.fast and not given:
+        return None
+    return FacetLimits()._replace(**given)
+
+
+def run(args):
+    """Render the charts selected by the parsed command-line options.
+
+    Prints each chart's status and the seconds spent drawing and encoding it.
+    With --cache-dir, bar-chart statistics are kept on disk across runs.
+    """
+    from aggregation import AggregationCache
+    from instrument import Tracer
+
+    specs = [s for s in CHARTS if args.only is None or s.name in args.only]
+    cache = AggregationCache(directory=args.cache_dir) if args.cache_dir else None
+    tracer = Tracer()
+    status = render_all(chart_frame(args.data), specs, args.out, args.format,
+                        args.countries, args.workers, args.force, cache, tracer,
+                        limits_from_args(args))
+    seconds = collections.defaultdict(float)
+    for record in tracer.records:
+        kind, _, name = record['name'].partition(':')
+        if kind in ('draw', 'encode'):
+            seconds[name] += record['wall_s']
+    for name, state in status.items():
+        took = '%8.2f s' % seconds[name] if name in seconds else ''
+        print('%-28s %-10s %s' % (name, state, took))
+    print('%-28s %-10s %8.2f s' % ('total', '', tracer.to_dict()['total_wall_s']))
+    return status
+
+
+def add_limit_arguments(parser):
+    """The facet reduction options of `limits_from_args`."""
+    parser.add_argument('--fast', action='store_true',
+                        help='reduce and paginate facet charts (see downsample.py)')
+    parser.add_argument('--max-facets', type=int, help='facets per page')
+    parser.add_argument('--max-points', type=int, help='points per facet')
+    parser.add_argument('--top-n', type=int, help='hue levels kept before "Other"')
+    return parser
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--data', default='all_data.csv')
+    parser.add_argument('--out', default='figures')
+    parser.add_argument('--format', nargs='+', default=['png'], choices=['png', 'svg'])
+    parser.add_argument('--countries', nargs='+')
+    parser.add_argument('--only', nargs='+', metavar='CHART')
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--force', action='store_true')
+    parser.add_argument('--cache-dir', help='keep bar-chart statistics in this directory')
+    add_limit_arguments(parser)
+    run(parser.parse_args(argv))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,556 @@
+# coding: utf-8
+"""Static HTML/PDF report bundle of the Step 12 blog post visuals.
+
+Step 12 asks for a blog post built from four charts: the In[11] violin
+plot, the In[22] GDP/LEABY scatter grid and the In[27] and In[26] line
+grids. `build` renders them with `render.render_all` and `export` writes
+
+    report/index.html    summary table and figures
+    report/report.pdf    the same content, one page per figure
+    report/images/       the figures, shrunk and re-encoded once
+
+in one pass. Each figure is downscaled to `max_width` pixels, flattened to
+RGB and quantized to a palette before it is written, and that one PNG is
+used twice: linked from the HTML and embedded in the PDF as its compressed
+pixel data, so it is never decoded or compressed again. Sections are cached
+in `report/.cache`, keyed on the render manifest's hash of each chart's
+spec and data: regenerating the report for another country subset only
+redraws and re-encodes the charts (or, with `--fast`, the facet pages)
+whose data changed.
+
+    python report.py --out report --countries Chile China Mexico
+    python report.py bench
+"""
+
+import argparse
+import collections
+import hashlib
+import html
+import io
+import json
+import os
+import struct
+import time
+import zlib
+
+from instrument import NULL_TRACER
+from panel import as_panel
+
+FORMATS = ('html', 'pdf')
+MAX_WIDTH = 1600
+COLORS = 256
+CACHE_DIR = '.cache'
+SECTIONS = 'sections.json'
+TITLE = 'Life Expectancy and GDP'
+
+REPORT_CHARTS = collections.OrderedDict([
+    ('leaby_violin', 'The distribution of life expectancy at birth in each country.'),
+    ('leaby_facet', 'GDP against life expectancy at birth, one panel per year.'),
+    ('gdp_facet', 'GDP over the years, one panel per country.'),
+    ('leaby_country_facet', 'Life expectancy at birth over the years, one panel per country.'),
+])
+
+SUMMARY_COLUMNS = ('Country', 'Years', 'Mean GDP ($bn)', 'GDP growth %', 'GDP CAGR %',
+                   'Mean LEABY', 'LEABY change')
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+PngImage = collections.namedtuple('PngImage', ['width', 'height', 'depth', 'color',
+                                               'palette', 'data'])
+PngImage.__doc__ = """Header fields, palette and concatenated IDAT data of a PNG."""
+
+
+def summary_table(panel):
+    """One row per country: years covered, GDP and LEABY means and growth."""
+    import pandas as pd
+    from query import QueryEngine
+
+    engine = QueryEngine(as_panel(panel).frame)
+    gdp = engine.country_tables['GDP']
+    leaby = engine.country_tables['LEABY']
+    return pd.DataFrame({
+        'Country': gdp.index,
+        'Years': ['%d-%d' % span for span in zip(gdp['first_year'], gdp['last_year'])],
+        'Mean GDP ($bn)': (gdp['mean'] / 1e9).to_numpy(),
+        'GDP growth %': gdp['growth'].to_numpy(),
+        'GDP CAGR %': gdp['cagr'].to_numpy(),
+        'Mean LEABY': leaby['mean'].to_numpy(),
+        'LEABY change': (leaby['last'] - leaby['first']).to_numpy(),
+    }, columns=list(SUMMARY_COLUMNS))
+
+
+def _format_cells(table):
+    # Every cell as display text, one list per row.
+    rows = []
+    for row in table.itertuples(index=False):
+        cells = [str(row[0]), row[1]]
+        cells.extend('' if value != value else '%.1f' % value for value in row[2:])
+        rows.append(cells)
+    return rows
+
+
+def _summary_html(table):
+    head = ''.join('<th>%s</th>' % html.escape(c) for c in table.columns)
+    body = ''.join('<tr>%s</tr>' % ''.join('<td>%s</td>' % html.escape(c) for c in cells)
+                   for cells in _format_cells(table))
+    return ('<section id="summary">\n<h2>Summary by country</h2>\n'
+            '<table>\n<thead><tr>%s</tr></thead>\n<tbody>%s</tbody>\n</table>\n</section>\n'
+            % (head, body))
+
+
+def _summary_lines(table):
+    # The summary as fixed-width text lines for the PDF.
+    rows = [list(table.columns)] + _format_cells(table)
+    widths = [min(max(len(row[i]) for row in rows), 28) for i in range(len(table.columns))]
+    lines = []
+    for number, row in enumerate(rows):
+        cells = [cell[:width].ljust(width) if i == 0 else cell[:width].rjust(width)
+                 for i, (cell, width) in enumerate(zip(row, widths))]
+        lines.append('  '.join(cells).rstrip())
+        if number == 0:
+            lines.append('-' * len(lines[0]))
+    return lines
+
+
+def optimize_image(data, max_width=MAX_WIDTH, colors=COLORS):
+    """Re-encode PNG bytes for the report; return (bytes, width, height).
+
+    The image is flattened onto white, scaled down to at most `max_width`
+    pixels wide and, unless `colors` is None, quantized to a palette of that
+    many colors (charts rarely need more).
+    """
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(data))
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        flat = Image.new('RGB', image.size, (255, 255, 255))
+        flat.paste(image, mask=image.getchannel('A'))
+        image = flat
+    elif image.mode != 'RGB':
+        image = image.convert('RGB')
+    if max_width is not None and image.width > max_width:
+        height = max(1, int(round(image.height * max_width / float(image.width))))
+        image = image.resize((max_width, height), Image.LANCZOS)
+    if colors is not None:
+        image = image.quantize(colors, method=Image.Quantize.FASTOCTREE,
+                               dither=Image.Dither.NONE)
+    out = io.BytesIO()
+    image.save(out, format='PNG', optimize=True)
+    return out.getvalue(), image.width, image.height
+
+
+def read_png(data):
+    """Parse PNG bytes into a PngImage without decompressing the pixels."""
+    if data[:8] != PNG_SIGNATURE:
+        raise ValueError('not a PNG file')
+    header = palette = None
+    chunks = []
+    pos = 8
+    while pos + 8 <= len(data):
+        length, kind = struct.unpack('>I4s', data[pos:pos + 8])
+        body = data[pos + 8:pos + 8 + length]
+        pos += 12 + length
+        if kind == b'IHDR':
+            header = struct.unpack('>IIBBBBB', body)
+        elif kind == b'PLTE':
+            palette = body
+        elif kind == b'IDAT':
+            chunks.append(body)
+        elif kind == b'IEND':
+            break
+    if header is None:
+        raise ValueError('PNG has no IHDR chunk')
+    width, height, depth, color, _, _, interlace = header
+    if interlace or color not in (0, 2, 3) or (color == 2 and depth != 8):
+        raise ValueError('only non-interlaced gray, RGB and palette PNGs can be embedded')
+    return PngImage(width, height, depth, color, palette, b''.join(chunks))
+
+
+def _pdf_text(text):
+    text = text.encode('cp1252', 'replace')
+    return b'(' + text.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+def _pdf_image(png):
+    # An image XObject that reuses the PNG's compressed data: PDF's Flate
+    # filter with PNG predictors reads the IDAT stream as it is.
+    colors = 3 if png.color == 2 else 1
+    if png.color == 3:
+        space = '[/Indexed /DeviceRGB %d <%s>]' % (len(png.palette) // 3 - 1,
+                                                  png.palette.hex())
+    else:
+        space = '/DeviceRGB' if png.color == 2 else '/DeviceGray'
+    head = ('<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace %s '
+            '/BitsPerComponent %d /Filter /FlateDecode /DecodeParms << /Predictor 15 '
+            '/Colors %d /BitsPerComponent %d /Columns %d >> /Length %d >>'
+            % (png.width, png.height, space, png.depth, colors, png.depth, png.width,
+               len(png.data)))
+    return head.encode('latin-1') + b'\nstream\n' + png.data + b'\nendstream'
+
+
+def _pdf_stream(content):
+    data = zlib.compress(content)
+    return (b'<< /Filter /FlateDecode /Length %d >>\nstream\n' % len(data)
+            + data + b'\nendstream')
+
+
+def write_pdf(path, title, lines, figures, page_size=(595, 842), margin=40):
+    """Write a PDF: `title` and text `lines`, then one page per figure.
+
+    `figures` is a list of (heading, caption, png_bytes); the PNGs must be
+    gray, RGB or palette images as written by `optimize_image`.
+    """
+    width, height = page_size
+    objects = [None, None]              # 1: catalog, 2: page tree
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    fonts = add(b'<< /F1 << /Type /Font /Subtype /Type1 /BaseFont /Helvetica '
+                b'/Encoding /WinAnsiEncoding >> /F2 << /Type /Font /Subtype /Type1 '
+                b'/BaseFont /Courier /Encoding /WinAnsiEncoding >> >>')
+    pages = []
+
+    def page(content, images=()):
+        xobjects = ''.join('/Im%d %d 0 R ' % (i, ref) for i, ref in enumerate(images))
+        resources = '<< /Font %d 0 R /XObject << %s>> >>' % (fonts, xobjects)
+        contents = add(_pdf_stream(content))
+        pages.append(add(('<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] '
+                          '/Resources %s /Contents %d 0 R >>'
+                          % (width, height, resources, contents)).encode('latin-1')))
+
+    # Courier 7 pt is 4.2 pt per character and 9 pt per line.
+    per_page = int((height - 2 * margin - 30) // 9)
+    first = True
+    for start in range(0, max(len(lines), 1), per_page):
+        content = b''
+        top = height - margin
+        if first:
+            content += b'BT /F1 18 Tf %d %d Td %s Tj ET\n' % (margin, top - 18, _pdf_text(title))
+            top -= 30
+            first = False
+        content += b'BT /F2 7 Tf 9 TL %d %d Td\n' % (margin, top - 9)
+        for line in lines[start:start + per_page]:
+            content += _pdf_text(line) + b' Tj T*\n'
+        page(content + b'ET\n')
+
+    for heading, caption, data in figures:
+        png = read_png(data)
+        image = add(_pdf_image(png))
+        box_w, box_h = width - 2 * margin, height - 2 * margin - 40
+        scale = min(box_w / float(png.width), box_h / float(png.height))
+        w, h = png.width * scale, png.height * scale
+        top = height - margin
+        content = (b'BT /F1 12 Tf %d %d Td %s Tj ET\n' % (margin, top - 12, _pdf_text(heading))
+                   + b'BT /F1 9 Tf %d %d Td %s Tj ET\n' % (margin, top - 28, _pdf_text(caption))
+                   + ('q %.2f 0 0 %.2f %.2f %.2f cm /Im0 Do Q\n'
+                      % (w, h, margin, top - 40 - h)).encode('latin-1'))
+        page(content, [image])
+
+    objects[0] = b'<< /Type /Catalog /Pages 2 0 R >>'
+    objects[1] = ('<< /Type /Pages /Kids [%s] /Count %d >>'
+                  % (' '.join('%d 0 R' % p for p in pages), len(pages))).encode('latin-1')
+    out = io.BytesIO()
+    out.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(b'%d 0 obj\n' % number + body + b'\nendobj\n')
+    xref = out.tell()
+    out.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+    out.write(b''.join(b'%010d 00000 n \n' % offset for offset in offsets))
+    out.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+              % (len(objects) + 1, xref))
+    with open(path + '.tmp', 'wb') as f:
+        f.write(out.getvalue())
+    os.replace(path + '.tmp', path)
+
+
+HTML_PAGE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>%(title)s</title>
+<style>
+body { font-family: sans-serif; max-width: 60em; margin: 2em auto; padding: 0 1em; }
+table { border-collapse: collapse; font-size: 0.85em; }
+th, td { padding: 0.2em 0.6em; border-bottom: 1px solid #ddd; }
+td + td { text-align: right; }
+img { max-width: 100%%; height: auto; }
+</style>
+</head>
+<body>
+<h1>%(title)s</h1>
+%(sections)s</body>
+</html>
+"""
+
+
+def _figure_html(name, heading, caption, image, width, height):
+    return ('<section id="%s">\n<h2>%s</h2>\n<figure>\n'
+            '<img src="images/%s" width="%d" height="%d" alt="%s" loading="lazy">\n'
+            '<figcaption>%s</figcaption>\n</figure>\n</section>\n'
+            % (name, html.escape(heading), image, width, height, html.escape(heading),
+               html.escape(caption)))
+
+
+def _chart_of(page):
+    # 'gdp_facet_p02' -> 'gdp_facet'
+    if page in REPORT_CHARTS:
+        return page
+    base, _, number = page.rpartition('_p')
+    return base if base in REPORT_CHARTS and number.isdigit() else None
+
+
+def _load_sections(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, SECTIONS)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_sections(cache_dir, sections):
+    path = os.path.join(cache_dir, SECTIONS)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(sections, f, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def export(panel, status, figure_dir, out_dir='report', formats=FORMATS, max_width=MAX_WIDTH,
+           colors=COLORS, title=TITLE, tracer=NULL_TRACER):
+    """Write the report bundle from a panel and the figures in `figure_dir`.
+
+    `status` is what `render.render_all` returned for `figure_dir`; charts
+    other than REPORT_CHARTS, and empty ones, are left out. Returns a dict
+    mapping each section to 'encoded' or 'cached'.
+    """
+    from aggregation import fingerprint
+    from render import CHARTS, load_manifest
+
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        raise ValueError('formats must be among %s, got %s' % (FORMATS, sorted(unknown)))
+    panel = as_panel(panel)
+    cache_dir = os.path.join(out_dir, CACHE_DIR)
+    image_dir = os.path.join(out_dir, 'images')
+    os.makedirs(cache_dir, exist_ok=True)
+    os.makedirs(image_dir, exist_ok=True)
+    cached = _load_sections(cache_dir)
+    manifest = load_manifest(figure_dir)
+    titles = dict((spec.name, spec.title) for spec in CHARTS)
+    sections = collections.OrderedDict()
+    result = collections.OrderedDict()
+
+    with tracer.stage('summary', rows=len(panel.frame)) as record:
+        key = fingerprint(panel.frame, ['Country', 'Year', 'GDP', 'LEABY'])
+        entry = cached.get('summary')
+        if entry is None or entry['key'] != key:
+            table = summary_table(panel)
+            entry = {'key': key, 'html': _summary_html(table), 'lines': _summary_lines(table)}
+            result['summary'] = 'encoded'
+        else:
+            result['summary'] = 'cached'
+        sections['summary'] = entry
+        record['countries'] = len(panel.countries)
+
+    with tracer.stage('images') as record:
+        for page, state in status.items():
+            chart = _chart_of(page)
+            if chart is None or state == 'empty':
+                continue
+            heading = titles.get(page) or titles[chart] or chart
+            if page != chart:
+                heading += ' (page %s)' % page[len(chart) + 2:].lstrip('0')
+            settings = repr((manifest[page], max_width, colors))
+            key = hashlib.sha1(settings.encode('utf-8')).hexdigest()
+            entry = cached.get(page)
+            image = key[:20] + '.png'
+            if (entry is None or entry['key'] != key
+                    or not os.path.exists(os.path.join(image_dir, image))):
+                with open(os.path.join(figure_dir, page + '.png'), 'rb') as f:
+                    source = f.read()
+                data, width, height = optimize_image(source, max_width, colors)
+                with open(os.path.join(image_dir, image), 'wb') as f:
+                    f.write(data)
+                entry = {'key': key, 'image': image, 'width': width, 'height': height,
+                         'source_bytes': len(source), 'bytes': len(data)}
+                result[page] = 'encoded'
+            else:
+                result[page] = 'cached'
+            entry['html'] = _figure_html(page, heading, REPORT_CHARTS[chart], image,
+                                         entry['width'], entry['height'])
+            entry['heading'] = heading
+            entry['caption'] = REPORT_CHARTS[chart]
+            sections[page] = entry
+        record['encoded'] = sum(1 for state in result.values() if state == 'encoded')
+
+    figures = [entry for name, entry in sections.items() if name != 'summary']
+    if 'html' in formats:
+        with tracer.stage('html'):
+            page = HTML_PAGE % {'title': html.escape(title),
+                                'sections': ''.join(entry['html'] for entry in sections.values())}
+            with open(os.path.join(out_dir, 'index.html'), 'w', encoding='utf-8') as f:
+                f.write(page)
+    if 'pdf' in formats:
+        with tracer.stage('pdf'):
+            images = []
+            for entry in figures:
+                with open(os.path.join(image_dir, entry['image']), 'rb') as f:
+                    images.append((entry['heading'], entry['caption'], f.read()))
+            write_pdf(os.path.join(out_dir, 'report.pdf'), title, sections['summary']['lines'],
+                      images)
+
+    # Images of sections that are gone would only grow the bundle.
+    current = set(entry['image'] for entry in figures)
+    for name in os.listdir(image_dir):
+        if name not in current:
+            os.remove(os.path.join(image_dir, name))
+    _save_sections(cache_dir, sections)
+    return result
+
+
+def build(data='all_data.csv', out_dir='report', countries=None, formats=FORMATS, workers=None,
+          force=False, limits=None, max_width=MAX_WIDTH, colors=COLORS, tracer=NULL_TRACER):
+    """Render the REPORT_CHARTS of `data` and export them with `export`.
+
+    `data` is a CSV path or a frame/Panel that already has the `render`
+    chart columns. Figures are drawn into `<out_dir>/.cache/figures`, so
+    unchanged charts are neither redrawn nor re-encoded on the next build.
+    Returns the render status and the export status.
+    """
+    from render import CHARTS, chart_frame, render_all
+
+    with tracer.stage('load') as record:
+        panel = as_panel(chart_frame(data) if isinstance(data, str) else data)
+        if countries is not None:
+            panel = as_panel(panel.select(list(countries)))
+        record['rows'] = len(panel.frame)
+    specs = [spec for name in REPORT_CHARTS for spec in CHARTS if spec.name == name]
+    figure_dir = os.path.join(out_dir, CACHE_DIR, 'figures')
+    with tracer.stage('render', rows=len(panel.frame)) as record:
+        rendered = render_all(panel, specs, figure_dir, ('png',), workers=workers, force=force,
+                              tracer=tracer, limits=limits)
+        record['rendered'] = sum(1 for state in rendered.values() if state == 'rendered')
+    with tracer.stage('export'):
+        exported = export(panel, rendered, figure_dir, out_dir, formats, max_width, colors,
+                          tracer=tracer)
+    return rendered, exported
+
+
+def _print_build(tracer, rendered, exported, out_dir):
+    for record in tracer.to_dict()['stages']:
+        if record['parent'] is None or record['parent'] == 'export':
+            print('%-12s %8.2f s' % (record['name'], record['wall_s']))
+    counts = collections.Counter(exported.values())
+    print('%d charts rendered, %d sections encoded, %d cached'
+          % (sum(1 for state in rendered.values() if state == 'rendered'),
+             counts['encoded'], counts['cached']))
+    paths = [os.path.join(out_dir, name) for name in ('index.html', 'report.pdf')]
+    sizes = [os.path.getsize(path) for path in paths if os.path.exists(path)]
+    image_dir = os.path.join(out_dir, 'images')
+    images = sum(os.path.getsize(os.path.join(image_dir, n)) for n in os.listdir(image_dir))
+    print('bundle: %.0f KB (images %.0f KB)' % ((sum(sizes) + images) / 1024.0, images / 1024.0))
+
+
+def benchmark(n_countries=60, n_years=20, out_dir=None):
+    """Build a report, rebuild it unchanged, then for a few more countries.
+
+    Facet charts are paginated (`downsample.FacetLimits`), so countries
+    added at the end of the list leave the earlier facet pages, and their
+    encoded images, untouched.
+    """
+    import shutil
+    import tempfile
+
+    from downsample import FacetLimits
+    from growth_metrics import add_growth_columns
+    from instrument import Tracer
+    from normalize import normalize
+    from synthetic import synthetic_panel
+
+    df = synthetic_panel(n_countries, n_years, first_year=2000)
+    df = normalize(add_growth_columns(df, base_year=2000), 'LEABY', 'index', base_year=2000)
+    names = sorted(df['Country'].unique())
+    own_dir = out_dir is None
+    out_dir = out_dir or tempfile.mkdtemp(prefix='le-gdp-report-')
+    runs = [('cold', names[:-4]), ('unchanged', names[:-4]), ('4 more countries', names),
+            ('back to subset', names[:-4])]
+    print('%-18s %8s %9s %8s %7s %8s' % ('build', 'seconds', 'rendered', 'encoded', 'cached',
+                                         'KB'))
+    try:
+        for label, countries in runs:
+            tracer = Tracer()
+            t0 = time.perf_counter()
+            rendered, exported = build(df, out_dir, countries, workers=1, tracer=tracer,
+                                       limits=FacetLimits())
+            elapsed = time.perf_counter() - t0
+            counts = collections.Counter(exported.values())
+            image_dir = os.path.join(out_dir, 'images')
+            size = sum(os.path.getsize(os.path.join(image_dir, n)) for n in os.listdir(image_dir))
+            size += os.path.getsize(os.path.join(out_dir, 'report.pdf'))
+            print('%-18s %8.2f %9d %8d %7d %8.0f'
+                  % (label, elapsed, sum(1 for s in rendered.values() if s == 'rendered'),
+                     counts['encoded'], counts['cached'], size / 1024.0))
+        entries = _load_sections(os.path.join(out_dir, CACHE_DIR)).values()
+        source = sum(e.get('source_bytes', 0) for e in entries)
+        optimized = sum(e.get('bytes', 0) for e in entries)
+        print('figures %.0f KB as rendered, %.0f KB optimized' % (source / 1024.0,
+                                                                 optimized / 1024.0))
+    finally:
+        if own_dir:
+            shutil.rmtree(out_dir, ignore_errors=True)
+
+
+def add_arguments(parser):
+    """The options of `python report.py` (and `cli.py report`)."""
+    from render import add_limit_arguments
+
+    parser.add_argument('--data', default='all_data.csv')
+    parser.add_argument('--out', default='report')
+    parser.add_argument('--format', nargs='+', default=list(FORMATS), choices=FORMATS)
+    parser.add_argument('--countries', nargs='+')
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--force', action='store_true', help='redraw every chart')
+    parser.add_argument('--max-width', type=int, default=MAX_WIDTH,
+                        help='widest image in pixels')
+    parser.add_argument('--colors', type=int, default=COLORS,
+                        help='palette size; 0 keeps full RGB')
+    add_limit_arguments(parser)
+    return parser
+
+
+def run(args):
+    """Build the report from parsed `add_arguments` options and print timings."""
+    from instrument import Tracer
+    from render import limits_from_args
+
+    tracer = Tracer()
+    rendered, exported = build(args.data, args.out, args.countries, args.format, args.workers,
+                               args.force, limits_from_args(args), args.max_width,
+                               args.colors or None, tracer)
+    _print_build(tracer, rendered, exported, args.out)
+    print('%-12s %8.2f s' % ('total', tracer.to_dict()['total_wall_s']))
+    return exported
+
+
+def main(argv=None):
+    import sys
+
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['bench']:
+        parser = argparse.ArgumentParser(description=benchmark.__doc__.splitlines()[0])
+        parser.add_argument('--countries', type=int, default=60)
+        parser.add_argument('--years', type=int, default=20)
+        parser.add_argument('--out', help='keep the bundle in this directory')
+        args = parser.parse_args(argv[1:])
+        benchmark(args.countries, args.years, args.out)
+        return
+    run(add_arguments(argparse.ArgumentParser(description=__doc__.splitlines()[0]))
+        .parse_args(argv))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+# coding: utf-8
+"""Chunked processing of country/year panels that do not fit in memory.
+
+The notebook loads the whole CSV into `df` and then copies it around. The
+functions here read the file in chunks instead and keep only per-country
+state between chunks, so memory is bounded by the chunk size and the number
+of countries rather than the number of rows. They produce the same results
+as the in-memory path:
+
+- `summarize` gives the per-country means behind the In[9]/In[10] bar
+  charts and the first-year GDP printed by In[14];
+- `stream_growth_columns` yields the rows with the In[15] growth columns
+  (see `growth_metrics.add_growth_columns`).
+
+Rows of one country may be spread over any number of chunks and interleaved
+with other countries, but each country's years must appear in increasing
+order, as they do in all_data.csv.
+"""
+
+import pandas as pd
+
+from data_loader import CSV_DTYPES, RENAME
+
+DEFAULT_CHUNKSIZE = 10 ** 6
+
+_STREAM_DTYPES = dict(CSV_DTYPES, Country=str)
+
+
+def iter_chunks(path, chunksize=DEFAULT_CHUNKSIZE):
+    """Yield the CSV at `path` as renamed DataFrames of `chunksize` rows."""
+    reader = pd.read_csv(path, dtype=_STREAM_DTYPES, chunksize=chunksize)
+    with reader:
+        for chunk in reader:
+            yield chunk.rename(columns=RENAME)
+
+
+class StreamingSummary(object):
+    """Per-country aggregates accumulated one chunk at a time.
+
+    Sums and counts are kept in float64, so means match a groupby over the
+    full frame up to rounding. With `base_year` set, each country's values
+    in that year are collected as well.
+    """
+
+    def __init__(self, values=('GDP', 'LEABY'), base_year=None):
+        self.values = list(values)
+        self.base_year = base_year
+        self.rows = 0
+        self._sums = None
+        self._counts = None
+        self._first = None
+        self._base = None
+
+    def update(self, chunk):
+        self.rows += len(chunk)
+        grouped = chunk.groupby('Country', sort=False)
+        # Widen before summing; LEABY is parsed as float32.
+        values = chunk[self.values].astype('float64').groupby(chunk['Country'], sort=False)
+        sums = values.sum()
+        counts = values.count()
+        if self._sums is None:
+            self._sums, self._counts = sums, counts
+        else:
+            self._sums = self._sums.add(sums, fill_value=0.0)
+            self._counts = self._counts.add(counts, fill_value=0)
+
+        first = chunk.loc[grouped['Year'].idxmin(), ['Country', 'Year'] + self.values]
+        first = first.set_index('Country')
+        if self._first is None:
+            self._first = first
+        else:
+            both = pd.concat([self._first, first])
+            keep = both.reset_index().groupby('Country', sort=False)['Year'].idxmin()
+            self._first = both.iloc[keep.to_numpy()]
+
+        if self.base_year is not None:
+            base = chunk[chunk['Year'] == self.base_year].set_index('Country')[self.values]
+            self._base = base if self._base is None else pd.concat([self._base, base])
+        return self
+
+    def country_means(self):
+        """Mean of each value per country, sorted by country name."""
+        return (self._sums / self._counts).sort_index()
+
+    def first_year_values(self, value='GDP'):
+        """Each country's value in its first year on record (cell In[14])."""
+        return self._first[value].sort_index()
+
+    def first_year(self):
+        """Earliest year seen across all countries."""
+        return int(self._first['Year'].min())
+
+    def base_values(self, value='GDP'):
+        """Each country's value in `base_year`, or in the earliest year overall."""
+        if self.base_year is None:
+            first = self._first[self._first['Year'] == self.first_year()]
+            return first[value].sort_index()
+        base = self._base[~self._base.index.duplicated(keep='first')]
+        return base[value].sort_index()
+
+
+def summarize(path, chunksize=DEFAULT_CHUNKSIZE, values=('GDP', 'LEABY'), base_year=None):
+    """Accumulate a `StreamingSummary` over the CSV at `path`."""
+    summary = StreamingSummary(values, base_year)
+    for chunk in iter_chunks(path, chunksize):
+        summary.update(chunk)
+    return summary
+
+
+def stream_growth_columns(path, value='GDP', base_year=None, chunksize=DEFAULT_CHUNKSIZE):
+    """Yield chunks of the CSV with the growth columns of cell In[15] added.
+
+    Reads the file twice: once to find the base-year values, then again to
+    compute the rows. Between chunks only the last year and value of each
+    country are carried over.
+    """
+    summary = summarize(path, chunksize, (value,), base_year)
+    if base_year is None:
+        base_year = summary.first_year()
+    bases = summary.base_values(value)
+    base_column = '%s_in_%d' % (value, base_year)
+
+    last_year = pd.Series(dtype='float64')
+    last_value = pd.Series(dtype='float64')
+    for chunk in iter_chunks(path, chunksize):
+        grouped = chunk.groupby('Country', sort=False)
+        prior_year = grouped['Year'].shift(1).astype('float64')
+        prior = grouped[value].shift(1)
+
+        opening = ~chunk['Country'].duplicated()
+        carried = chunk.loc[opening, 'Country']
+        prior_year[opening] = carried.map(last_year).to_numpy()
+        prior[opening] = carried.map(last_value).to_numpy()
+        if (chunk['Year'] <= prior_year).any():
+            raise ValueError('years must increase within each country')
+
+        # After a missing year the prior value is unknown, as in
+        # `growth_metrics.add_growth_columns`.
+        first = prior_year.isna()
+        prior = prior.where(first | (prior_year == chunk['Year'] - 1))
+        chunk['prior_year_' + value] = prior.where(~first, 0.0)
+        chunk['percent_growth'] = (chunk[value] / prior * 100.0).where(~first, 0.0)
+        chunk[base_column] = chunk['Country'].map(bases).astype('float64')
+        chunk['percent_growth_%ds' % base_year] = chunk[value] / chunk[base_column] * 100.0
+
+        closing = chunk.drop_duplicates('Country', keep='last').set_index('Country')
+        last_year = closing['Year'].astype('float64').combine_first(last_year)
+        # Unconditionally: a missing closing value must not leave an older
+        # year's value behind as the next chunk's prior.
+        last_value = last_value.reindex(last_year.index)
+        last_value[closing.index] = closing[value].to_numpy(dtype='float64')
+        yield chunk
+
+
+def write_growth_columns(path, out_path, value='GDP', base_year=None,
+                         chunksize=DEFAULT_CHUNKSIZE):
+    """Write the CSV at `path` with growth columns to `out_path`, chunk by chunk."""
+    header = True
+    rows = 0
+    for chunk in stream_growth_columns(path, value, base_year, chunksize):
+        chunk.to_csv(out_path, mode='w' if header else 'a', header=header, index=False)
+        header = False
+        rows += len(chunk)
+    return rows
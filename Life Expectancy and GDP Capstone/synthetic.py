@@ -0,0 +1,43 @@
+# coding: utf-8
+"""Synthetic country/year panels with the same schema as all_data.csv.
+
+Used by the benchmarks to see how the analysis scales past the 96 rows
+that ship with the project.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def synthetic_panel(n_countries=200, n_years=60, first_year=1960, seed=0):
+    """Return a panel of `n_countries` x `n_years` rows sorted by Country, Year.
+
+    Columns match all_data.csv after the In[7] rename: Country, Year,
+    LEABY and GDP. GDP follows a random walk in log space so growth rates
+    look like real national accounts data.
+    """
+    rng = np.random.default_rng(seed)
+    countries = np.array(['Country %05d' % i for i in range(n_countries)])
+    years = np.arange(first_year, first_year + n_years)
+
+    start_gdp = np.exp(rng.uniform(20, 30, size=(n_countries, 1)))
+    log_growth = rng.normal(0.03, 0.05, size=(n_countries, n_years))
+    log_growth[:, 0] = 0.0
+    gdp = start_gdp * np.exp(np.cumsum(log_growth, axis=1))
+
+    start_leaby = rng.uniform(45, 80, size=(n_countries, 1))
+    leaby = start_leaby + np.cumsum(rng.normal(0.1, 0.3, size=(n_countries, n_years)), axis=1)
+
+    return pd.DataFrame({
+        'Country': np.repeat(countries, n_years),
+        'Year': np.tile(years, n_countries),
+        'LEABY': leaby.ravel().round(1),
+        'GDP': gdp.ravel(),
+    })
+
+
+def synthetic_rows(n_rows, n_years=60, seed=0):
+    """Return a synthetic panel with roughly `n_rows` rows."""
+    n_years = min(n_years, max(n_rows, 1))
+    n_countries = max(n_rows // n_years, 1)
+    return synthetic_panel(n_countries, n_years, seed=seed)
@@ -0,0 +1,65 @@
+# coding: utf-8
+"""The notebook analyses agree on a frame and on its compact form."""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from compact import FLOAT_RTOL, compact_frame
+from growth_metrics import add_growth_columns
+from panel import Panel
+from synthetic import synthetic_rows
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def means(frame):
+    return frame.groupby('Country', observed=True)[['GDP', 'LEABY']].mean()
+
+
+def first_year_gdp(frame):
+    return pd.Series({c: rows['GDP'].iloc[0] for c, rows in Panel(frame)})
+
+
+def growth_columns(frame):
+    out = add_growth_columns(Panel(frame), base_year=int(frame['Year'].min()))
+    return out.drop(columns=list(frame.columns)).reset_index(drop=True)
+
+
+def leaby_distribution(frame):
+    return frame.groupby('Country', observed=True)['LEABY'].describe()
+
+
+@pytest.fixture(scope='module')
+def frame():
+    return synthetic_rows(20000).astype({'Country': object})
+
+
+@pytest.mark.parametrize('analysis', [means, first_year_gdp, growth_columns,
+                                      leaby_distribution])
+def test_analyses_agree(frame, analysis):
+    compact = compact_frame(frame)
+    a = analysis(frame).to_numpy(dtype='float64')
+    b = analysis(compact).to_numpy(dtype='float64')
+    # Spreads of float32 columns can differ by rtol of the values
+    # themselves, not of the (much smaller) spread.
+    scale = np.nanmax(np.abs(a), initial=0.0)
+    np.testing.assert_allclose(b, a, rtol=FLOAT_RTOL, atol=FLOAT_RTOL * scale)
+
+
+def test_dtypes(frame):
+    compact = compact_frame(frame)
+    assert isinstance(compact['Country'].dtype, pd.CategoricalDtype)
+    assert compact['Year'].dtype == np.int16
+    assert compact['LEABY'].dtype == np.float32
+    assert compact['GDP'].dtype == np.float64
+
+
+def test_loader_parses_to_compact_dtypes():
+    from data_loader import RENAME, read_csv
+
+    path = os.path.join(HERE, 'all_data.csv')
+    plain = pd.read_csv(path).rename(columns=RENAME)
+    assert dict(compact_frame(plain).dtypes) == dict(read_csv(path).dtypes)
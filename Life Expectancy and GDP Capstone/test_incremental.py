@@ -0,0 +1,91 @@
+# coding: utf-8
+"""Incremental updates must give what a full recomputation gives."""
+
+import os
+
+import numpy as np
+import pytest
+
+from data_loader import load_data
+from incremental import VALUES, IncrementalPanel
+from synthetic import synthetic_panel
+
+BASE_YEAR = 2000
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def assert_matches_full_recompute(state):
+    raw = state.frame[['Country', 'Year', 'GDP', 'LEABY']]
+    full = IncrementalPanel.build(raw, state.base_year, state.value)
+    columns = ['prior_year_' + state.value, 'percent_growth', state.base_column,
+               state.base_growth_column]
+    assert list(state.frame['Country'].astype(str)) == list(full.frame['Country'].astype(str))
+    assert list(state.frame['Year']) == list(full.frame['Year'])
+    np.testing.assert_allclose(state.frame[columns].to_numpy(dtype='float64'),
+                               full.frame[columns].to_numpy(dtype='float64'))
+    np.testing.assert_allclose(state.country_means().to_numpy(),
+                               full.country_means().to_numpy())
+
+
+@pytest.fixture
+def panel():
+    return synthetic_panel(12, 10, first_year=BASE_YEAR, seed=1)
+
+
+def test_append_new_years(panel):
+    state = IncrementalPanel.build(panel[panel['Year'] < 2008], BASE_YEAR)
+    changed = state.append(panel[panel['Year'] == 2008])
+    assert len(changed) == 12
+    state.append(panel[panel['Year'] == 2009])
+    assert_matches_full_recompute(state)
+
+
+def test_append_new_country(panel):
+    old = panel[panel['Country'] != 'Country 00005']
+    state = IncrementalPanel.build(old, BASE_YEAR)
+    assert state.append(panel[panel['Country'] == 'Country 00005']) == ['Country 00005']
+    assert_matches_full_recompute(state)
+
+
+def test_back_fill_earlier_years(panel):
+    # Rows before a country's first year, including its base year, change
+    # its prior year and its base.
+    late = (panel['Country'] == 'Country 00003') & (panel['Year'] < 2004)
+    state = IncrementalPanel.build(panel[~late], BASE_YEAR)
+    state.append(panel[late])
+    assert_matches_full_recompute(state)
+
+
+def test_gappy_years(panel):
+    rng = np.random.default_rng(2)
+    missing = rng.random(len(panel)) < 0.2
+    state = IncrementalPanel.build(panel[~missing], BASE_YEAR)
+    assert np.isnan(state.frame['percent_growth']).any()
+    # Fill half of the gaps, then the rest.
+    holes = panel[missing]
+    state.append(holes.iloc[::2])
+    assert_matches_full_recompute(state)
+    state.append(holes.iloc[1::2])
+    assert_matches_full_recompute(state)
+    assert not np.isnan(state.frame['percent_growth']).any()
+
+
+def test_rejects_known_pairs(panel):
+    state = IncrementalPanel.build(panel, BASE_YEAR)
+    with pytest.raises(ValueError):
+        state.append(panel.iloc[:1])
+
+
+def test_loaded_means_are_float64():
+    # LEABY loads as float32; the running means must still agree with a
+    # float64 mean, both after a build and after appends.
+    df = load_data(os.path.join(HERE, 'all_data.csv'), use_cache=False)
+    expected = (df.astype(dict.fromkeys(VALUES, 'float64'))
+                .groupby('Country', sort=True, observed=True)[list(VALUES)].mean())
+    state = IncrementalPanel.build(df[df['Year'] < 2010], BASE_YEAR)
+    state.append(df[df['Year'] >= 2010])
+    for means in (IncrementalPanel.build(df, BASE_YEAR).country_means(),
+                  state.country_means()):
+        np.testing.assert_allclose(means[list(VALUES)].to_numpy(), expected.to_numpy(),
+                                   rtol=1e-14)
+    assert_matches_full_recompute(state)
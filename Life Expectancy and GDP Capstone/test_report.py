@@ -0,0 +1,113 @@
+# coding: utf-8
+"""The hand-written PNG reader and PDF writer of the report bundle."""
+
+import io
+import re
+import zlib
+
+import numpy as np
+import pytest
+
+from report import optimize_image, read_png, write_pdf
+
+PIL = pytest.importorskip('PIL.Image')
+
+
+def png_bytes(mode, size=(37, 23), seed=0):
+    rng = np.random.default_rng(seed)
+    channels = {'L': 1, 'RGB': 3, 'RGBA': 4}[mode]
+    pixels = rng.integers(0, 256, size=(size[1], size[0], channels), dtype=np.uint8)
+    image = PIL.fromarray(pixels[:, :, 0] if channels == 1 else pixels, mode)
+    out = io.BytesIO()
+    image.save(out, format='PNG')
+    return out.getvalue()
+
+
+def parse_pdf(data):
+    """Objects by number, checked against the xref table and trailer."""
+    start = int(re.search(rb'startxref\n(\d+)\n%%EOF\n$', data).group(1))
+    assert data[start:start + 5] == b'xref\n'
+    count = int(re.match(rb'xref\n0 (\d+)\n', data[start:]).group(1))
+    entries = re.findall(rb'(\d{10}) (\d{5}) ([nf]) \n', data[start:])
+    assert len(entries) == count
+    trailer = re.search(rb'trailer\n<< /Size (\d+) /Root (\d+) 0 R >>', data)
+    assert int(trailer.group(1)) == count
+
+    objects = {}
+    for number, (offset, _, kind) in enumerate(entries):
+        if kind == b'f':
+            continue
+        offset = int(offset)
+        head = b'%d 0 obj\n' % number
+        assert data[offset:offset + len(head)] == head, 'xref offset of object %d' % number
+        end = data.index(b'\nendobj\n', offset)
+        objects[number] = data[offset + len(head):end]
+    return objects, int(trailer.group(2))
+
+
+def stream(body):
+    # The dictionary and the stream bytes, with /Length checked.
+    length = int(re.search(rb'/Length (\d+)', body).group(1))
+    start = body.index(b'\nstream\n') + len(b'\nstream\n')
+    assert body[start + length:] == b'\nendstream', 'stream /Length'
+    return body[:start], body[start:start + length]
+
+
+@pytest.mark.parametrize('mode', ['L', 'RGB', 'RGBA'])
+def test_optimized_png_is_embeddable(mode):
+    data, width, height = optimize_image(png_bytes(mode), max_width=20)
+    png = read_png(data)
+    assert (png.width, png.height) == (width, height) == (20, 12)
+    assert png.color == 3 and len(png.palette) % 3 == 0
+
+
+def test_read_png_keeps_compressed_data():
+    data = png_bytes('RGB')
+    png = read_png(data)
+    assert (png.width, png.height, png.depth, png.color) == (37, 23, 8, 2)
+    # One filter byte and three bytes per pixel on every row.
+    assert len(zlib.decompress(png.data)) == 23 * (1 + 37 * 3)
+
+
+def test_read_png_rejects_other_files():
+    with pytest.raises(ValueError):
+        read_png(b'%PDF-1.4\n')
+    with pytest.raises(ValueError):
+        read_png(png_bytes('RGBA'))
+
+
+def test_pdf_structure(tmp_path):
+    images = [optimize_image(png_bytes('RGB', seed=1))[0],
+              optimize_image(png_bytes('RGB', seed=2), colors=None)[0]]
+    lines = ['Country  (GDP)  \\ %d' % i for i in range(200)]
+    path = str(tmp_path / 'report.pdf')
+    write_pdf(path, u'Life expectancy – GDP', lines,
+              [('First', 'Caption', images[0]), ('Second', 'Caption', images[1])])
+    with open(path, 'rb') as f:
+        data = f.read()
+    assert data.startswith(b'%PDF-1.4\n')
+    objects, root = parse_pdf(data)
+
+    assert b'/Type /Catalog' in objects[root]
+    pages = re.search(rb'/Kids \[([^\]]*)\] /Count (\d+)', objects[2])
+    kids = [int(n) for n in re.findall(rb'(\d+) 0 R', pages.group(1))]
+    # 200 summary lines need three text pages, then one page per figure.
+    assert len(kids) == int(pages.group(2)) == 5
+    texts = []
+    for number in kids:
+        page = objects[number]
+        assert b'/Type /Page' in page
+        contents = int(re.search(rb'/Contents (\d+) 0 R', page).group(1))
+        texts.append(zlib.decompress(stream(objects[contents])[1]))
+    assert b'(Life expectancy \x96 GDP) Tj' in texts[0]
+    assert b'(Country  \\(GDP\\)  \\\\ 0) Tj' in texts[0]
+
+    embedded = [stream(body) for body in objects.values() if b'/Subtype /Image' in body]
+    assert len(embedded) == 2
+    for (head, data), source in zip(embedded, images):
+        png = read_png(source)
+        assert data == png.data
+        assert int(re.search(rb'/Width (\d+)', head).group(1)) == png.width
+        assert int(re.search(rb'/Height (\d+)', head).group(1)) == png.height
+    assert b'/Indexed /DeviceRGB' in embedded[0][0]
+    assert b'/ColorSpace /DeviceRGB' in embedded[1][0]